@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+Проверка config.json по таблице схемы — общая для parser.py и workflow.py
+
+Схема: {секция: {поле: кортеж допустимых типов}}; каждый скрипт хранит
+свою таблицу с полями, которые он использует.
+"""
+
+
+def validate_config(config, schema):
+    """
+    Проверяет config.json по таблице схемы за один проход
+
+    Args:
+        config: Загруженный config.json
+        schema: {секция: {поле: допустимые типы}}
+
+    Returns:
+        str: Описание первой найденной ошибки или None
+    """
+    if not isinstance(config, dict):
+        return "config.json должен содержать JSON-объект"
+
+    for section, fields in schema.items():
+        if section not in config:
+            return f"поле '{section}' отсутствует в config.json"
+        if not isinstance(config[section], dict):
+            return f"поле '{section}' должно быть объектом"
+
+        for field, types in fields.items():
+            if field not in config[section]:
+                return f"поле '{section}.{field}' отсутствует в config.json"
+            if not isinstance(config[section][field], types):
+                type_names = ' или '.join(t.__name__ for t in types)
+                return f"поле '{section}.{field}' должно иметь тип {type_names}"
+
+    return None
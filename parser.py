@@ -2,39 +2,82 @@
 # -*- coding: utf-8 -*-
 
 import os
+import csv
 import json
 import sys
-import urllib.request
-import urllib.error
+import functools
+import gzip
+import hashlib
+import heapq
+import itertools
+import random
+import re
+import http.client
+import threading
+import urllib.parse
 import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from operator import itemgetter
+
+from config_schema import validate_config
 
 
 # API настройки
 API_BASE_URL = "https://api.wordstat.yandex.net"
 API_METHOD = "/v1/topRequests"
 
+# Границы паузы между повторами запроса (сек), decorrelated jitter
+RETRY_BASE_DELAY = 1
+RETRY_MAX_DELAY = 30
+
+# Поля ответа API, которые использует парсер (остальные, например
+# associations, отбрасываются сразу после разбора)
+RESPONSE_FIELDS = ('totalCount', 'topRequests')
+
+# Папка дискового кэша ответов API
+CACHE_DIR = '.wordstat_cache'
+
 # Словари для категоризации
 CATEGORY_KEYWORDS = {
-    'commercial': [
+    'commercial': frozenset([
         'купить', 'заказать', 'под ключ', 'недорого', 'дешево',
         'цена', 'стоимость', 'прайс', 'акция', 'скидка',
         'доставка', 'установка', 'монтаж', 'вызвать', 'услуги'
-    ],
-    'informational': [
+    ]),
+    'informational': frozenset([
         'как', 'что такое', 'почему', 'зачем', 'когда',
         'где', 'какой', 'какая', 'какие', 'способы',
         'методы', 'инструкция', 'руководство', 'советы', 'этапы'
-    ],
-    'price': [
+    ]),
+    'price': frozenset([
         'цена', 'стоимость', 'прайс', 'сколько стоит',
         'расценки', 'тариф', 'стоит', 'за квадратный метр'
-    ],
-    'comparison': [
+    ]),
+    'comparison': frozenset([
         'отзывы', 'рейтинг', 'лучшие', 'топ', 'сравнение',
         'vs', 'или', 'какой выбрать', 'что лучше'
-    ]
+    ])
 }
 
+# Порядок проверки категорий: первая совпавшая побеждает
+# Ценовые слова ('цена', 'стоимость', 'сколько стоит') важнее коммерческих и
+# информационных: «ремонт кухни цена» — Price, а не Commercial, и
+# «как узнать сколько стоит ремонт» — Price, а не Informational
+CATEGORY_PRIORITY = ('price', 'commercial', 'informational', 'comparison')
+
+# Ключевые слова в порядке приоритета категорий. Проверка подстрокой
+# (`in`) на коротких фразах быстрее, чем regex-альтернация: re в CPython
+# перебирает альтернативы в каждой позиции, а не строит автомат
+CATEGORY_MATCHERS = tuple(
+    (category, tuple(sorted(CATEGORY_KEYWORDS[category])))
+    for category in CATEGORY_PRIORITY
+)
+
+# Ключ сортировки фраз по частотности
+COUNT_KEY = itemgetter('count')
+
 # Эмодзи для типов
 CATEGORY_EMOJI = {
     'commercial': '🛒',
@@ -46,8 +89,54 @@ CATEGORY_EMOJI = {
 }
 
 
+# Строка .env вида KEY=VALUE (комментарии и пустые строки не совпадают)
+ENV_LINE_RE = re.compile(r'^[ \t]*([^#=\s][^=\n]*?)[ \t]*=[ \t]*(.*?)[ \t]*$', re.MULTILINE)
+
+# mtime уже применённого к os.environ файла .env
+_applied_env_mtime = None
+
+# Схема config.json: {секция: {обязательное поле: допустимые типы}}.
+# Проверяется один раз при загрузке, чтобы ошибка в настройках
+# останавливала запуск до первого запроса к API
+CONFIG_SCHEMA = {
+    'business_info': {
+        'city': (str,),
+        'region_code': (int,),
+    },
+    'parser_settings': {
+        'devices': (list,),
+        'top_results_limit': (int,),
+        'delay_between_requests': (int, float),
+    },
+}
+
+
+@functools.lru_cache(maxsize=None)
+def load_env_cached(path, mtime_ns):
+    """Парсит файл .env; кэш сбрасывается при изменении mtime файла"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return dict(ENV_LINE_RE.findall(f.read()))
+
+
+@functools.lru_cache(maxsize=None)
+def load_json_cached(path, mtime_ns):
+    """Читает JSON-файл; кэш сбрасывается при изменении mtime файла"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+@functools.lru_cache(maxsize=None)
+def load_lines_cached(path, mtime_ns):
+    """Читает непустые строки файла; кэш сбрасывается при изменении mtime файла"""
+    # Одно чтение и splitlines на уровне C вместо построчной итерации
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    return tuple(line for line in map(str.strip, lines) if line)
+
+
 def load_env():
     """Загружает переменные окружения из файла .env"""
+    global _applied_env_mtime
     env_path = '.env'
 
     if not os.path.exists(env_path):
@@ -55,12 +144,11 @@ def load_env():
         print("📝 Скопируйте .env.example в .env и добавьте токен")
         sys.exit(1)
 
-    with open(env_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            line = line.strip()
-            if line and not line.startswith('#') and '=' in line:
-                key, value = line.split('=', 1)
-                os.environ[key.strip()] = value.strip()
+    # Переменные применяются повторно только если файл изменился
+    mtime_ns = os.stat(env_path).st_mtime_ns
+    if mtime_ns != _applied_env_mtime:
+        os.environ.update(load_env_cached(env_path, mtime_ns))
+        _applied_env_mtime = mtime_ns
 
     token = os.getenv('YANDEX_WORDSTAT_TOKEN')
     if not token or token == 'your_token_here':
@@ -79,18 +167,35 @@ def load_config():
         sys.exit(1)
 
     try:
-        with open(config_path, 'r', encoding='utf-8') as f:
-            config = json.load(f)
+        config = load_json_cached(config_path, os.stat(config_path).st_mtime_ns)
     except json.JSONDecodeError as e:
         print(f"❌ Ошибка парсинга config.json: {e}")
         sys.exit(1)
 
-    # Валидация обязательных полей
-    required_fields = ['business_info', 'parser_settings']
-    for field in required_fields:
-        if field not in config:
-            print(f"❌ Ошибка: поле '{field}' отсутствует в config.json")
-            sys.exit(1)
+    return prepare_config(config)
+
+
+def prepare_config(config):
+    """
+    Проверяет конфигурацию и дополняет её производными значениями
+
+    Args:
+        config: Загруженный config.json (изменяется на месте)
+
+    Returns:
+        dict: Та же конфигурация с полями city_lower и minus_words_lower
+    """
+    # Валидация обязательных полей и их типов
+    error = validate_config(config, CONFIG_SCHEMA)
+    if error:
+        print(f"❌ Ошибка: {error}")
+        sys.exit(1)
+
+    # Значения в нижнем регистре считаются один раз при загрузке,
+    # а не в каждом вызове фильтров и категоризации
+    config['business_info']['city_lower'] = config['business_info']['city'].lower()
+    settings = config['parser_settings']
+    settings['minus_words_lower'] = prepare_minus_words(settings.get('minus_words', []))
 
     return config
 
@@ -104,8 +209,7 @@ def load_queries():
         print("📝 Используйте Claude Code для генерации запросов")
         sys.exit(1)
 
-    with open(queries_path, 'r', encoding='utf-8') as f:
-        queries = [line.strip() for line in f if line.strip()]
+    queries = load_lines_cached(queries_path, os.stat(queries_path).st_mtime_ns)
 
     if not queries:
         print("❌ Ошибка: queries.txt пустой!")
@@ -114,7 +218,129 @@ def load_queries():
     return queries
 
 
-def fetch_top_requests(token, phrase, region, devices, max_retries=3):
+# Keep-alive соединения с API (по одному на поток)
+_thread_local = threading.local()
+
+
+class RateLimiter:
+    """Глобальный ограничитель частоты запросов, общий для всех потоков"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._next_time = 0.0
+
+    def wait(self):
+        """
+        Блокирует поток, пока не наступит его очередь отправить запрос
+
+        Returns:
+            bool: False, если ограничитель остановлен и запрос отправлять не нужно
+        """
+        with self._lock:
+            now = time.monotonic()
+            start_time = max(now, self._next_time)
+            self._next_time = start_time + self.interval
+        if start_time > now:
+            self.stopped.wait(start_time - now)
+        return not self.stopped.is_set()
+
+    def stop(self):
+        """Останавливает ограничитель: ожидающие потоки сразу получают False"""
+        self.stopped.set()
+
+
+def sleep_before_retry(seconds, rate_limiter=None):
+    """Пауза перед повтором; False, если парсинг остановлен (Ctrl+C)"""
+    if rate_limiter is None:
+        time.sleep(seconds)
+        return True
+    return not rate_limiter.stopped.wait(seconds)
+
+
+def get_connection():
+    """Возвращает keep-alive соединение с API для текущего потока"""
+    connection = getattr(_thread_local, 'connection', None)
+    if connection is None:
+        url = urllib.parse.urlsplit(API_BASE_URL)
+        if url.scheme == 'https':
+            connection = http.client.HTTPSConnection(url.netloc, timeout=30)
+        else:
+            connection = http.client.HTTPConnection(url.netloc, timeout=30)
+        _thread_local.connection = connection
+    return connection
+
+
+def close_connection():
+    """Закрывает соединение текущего потока (следующий запрос откроет новое)"""
+    connection = getattr(_thread_local, 'connection', None)
+    if connection is not None:
+        connection.close()
+        _thread_local.connection = None
+
+
+def post_request(path, body, headers):
+    """
+    Отправляет POST-запрос через keep-alive соединение потока
+
+    Если сервер успел закрыть простаивающее соединение,
+    запрос один раз повторяется через новое соединение.
+    Ответ, сжатый gzip, распаковывается.
+
+    Returns:
+        tuple: (HTTP статус, тело ответа в байтах)
+    """
+    for reconnect in (True, False):
+        connection = get_connection()
+        try:
+            connection.request('POST', path, body=body, headers=headers)
+            response = connection.getresponse()
+            data = response.read()
+            if (response.getheader('Content-Encoding') or '').lower() == 'gzip':
+                data = gzip.decompress(data)
+            return response.status, data
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            close_connection()
+            if not reconnect:
+                raise
+        except Exception:
+            close_connection()
+            raise
+
+
+@functools.lru_cache(maxsize=None)
+def get_request_body_tail(region, devices):
+    """Сериализованная неизменная часть тела запроса (регион и устройства)"""
+    return json.dumps({"regions": [region], "devices": list(devices)})[1:].encode('utf-8')
+
+
+def build_request_body(phrase, region, devices):
+    """
+    Тело запроса к API: сериализуется только фраза
+
+    Регион и устройства одинаковы для всего запуска, поэтому их JSON
+    строится один раз и дописывается к фразе.
+    """
+    return b'{"phrase": ' + json.dumps(phrase).encode('utf-8') + b', ' + get_request_body_tail(region, tuple(devices))
+
+
+def next_retry_delay(previous_delay):
+    """
+    Пауза перед следующим повтором (decorrelated jitter)
+
+    Случайная пауза в диапазоне [RETRY_BASE_DELAY, previous_delay * 3]
+    не даёт параллельным потокам повторять запросы синхронно.
+    """
+    return min(RETRY_MAX_DELAY, random.uniform(RETRY_BASE_DELAY, previous_delay * 3))
+
+
+def is_retryable_status(status):
+    """429 и 5xx — временные ошибки, остальные 4xx повтором не исправить"""
+    return status == 429 or status >= 500
+
+
+def fetch_top_requests(token, phrase, region, devices, max_retries=3, rate_limiter=None, log=print):
     """
     Получает топ популярных запросов для фразы из API Вордстата
 
@@ -124,77 +350,282 @@ def fetch_top_requests(token, phrase, region, devices, max_retries=3):
         region: Код региона (например, 213 для Москвы)
         devices: Список устройств ['desktop', 'mobile']
         max_retries: Количество попыток при ошибке
+        rate_limiter: RateLimiter для соблюдения интервала между запросами
+        log: Функция вывода сообщений об ошибках и повторах
 
     Returns:
         dict: JSON с результатами или None при ошибке
     """
-    url = API_BASE_URL + API_METHOD
+    path = urllib.parse.urlsplit(API_BASE_URL).path + API_METHOD
 
     # Формируем тело запроса
-    data = {
-        "phrase": phrase,
-        "regions": [region],
-        "devices": devices
-    }
-
-    json_data = json.dumps(data).encode('utf-8')
+    json_data = build_request_body(phrase, region, devices)
 
     # Заголовки
     headers = {
         'Content-Type': 'application/json;charset=utf-8',
+        'Accept-Encoding': 'gzip',
         'Authorization': f'Bearer {token}'
     }
 
     # Попытки запроса с ретраями
+    wait_time = RETRY_BASE_DELAY
     for attempt in range(1, max_retries + 1):
-        try:
-            request = urllib.request.Request(
-                url,
-                data=json_data,
-                headers=headers,
-                method='POST'
-            )
+        if rate_limiter and not rate_limiter.wait():
+            return None
 
-            with urllib.request.urlopen(request, timeout=30) as response:
-                result = json.loads(response.read().decode('utf-8'))
-                return result
+        try:
+            status, body = post_request(path, json_data, headers)
 
-        except urllib.error.HTTPError as e:
-            error_body = e.read().decode('utf-8') if e.fp else 'No details'
-            print(f"   ⚠️ HTTP ошибка {e.code}: {error_body}")
+        except (http.client.HTTPException, OSError) as e:
+            log(f"   ⚠️ Ошибка соединения: {e}")
 
             if attempt < max_retries:
-                wait_time = 5 * attempt
-                print(f"   🔄 Повтор через {wait_time} сек... (попытка {attempt}/{max_retries})")
-                time.sleep(wait_time)
-            else:
-                print(f"   ❌ Не удалось получить данные после {max_retries} попыток")
-                return None
+                wait_time = next_retry_delay(wait_time)
+                log(f"   🔄 Повтор через {wait_time:.1f} сек...")
+                if not sleep_before_retry(wait_time, rate_limiter):
+                    return None
+                continue
+            return None
 
-        except urllib.error.URLError as e:
-            print(f"   ⚠️ Ошибка соединения: {e.reason}")
+        except Exception as e:
+            log(f"   ❌ Неожиданная ошибка: {e}")
+            return None
 
-            if attempt < max_retries:
-                wait_time = 5 * attempt
-                print(f"   🔄 Повтор через {wait_time} сек...")
-                time.sleep(wait_time)
-            else:
+        if status >= 400:
+            error_body = body.decode('utf-8', errors='replace') or 'No details'
+            log(f"   ⚠️ HTTP ошибка {status}: {error_body}")
+
+            if not is_retryable_status(status):
+                log("   ❌ Запрос отклонён API, повтор не выполняется")
                 return None
 
-        except Exception as e:
-            print(f"   ❌ Неожиданная ошибка: {e}")
+            if attempt < max_retries:
+                wait_time = next_retry_delay(wait_time)
+                log(f"   🔄 Повтор через {wait_time:.1f} сек... (попытка {attempt}/{max_retries})")
+                if not sleep_before_retry(wait_time, rate_limiter):
+                    return None
+                continue
+            log(f"   ❌ Не удалось получить данные после {max_retries} попыток")
             return None
 
+        # json.loads принимает байты напрямую — без промежуточного decode()
+        try:
+            data = json.loads(body)
+        except ValueError as e:
+            log(f"   ❌ Неожиданная ошибка: {e}")
+            return None
+
+        if not isinstance(data, dict):
+            return data
+        return {key: data[key] for key in RESPONSE_FIELDS if key in data}
+
     return None
 
 
-def has_minus_words(phrase, minus_words):
+def get_cache_path(phrase, region, devices):
+    """Путь к файлу кэша для комбинации (фраза, регион, устройства)"""
+    key = json.dumps([phrase, region, sorted(devices)], ensure_ascii=False)
+    return os.path.join(CACHE_DIR, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+
+def read_cache(cache_path, ttl):
+    """Возвращает закэшированный ответ API, если он моложе ttl секунд, иначе None"""
+    try:
+        if time.time() - os.path.getmtime(cache_path) > ttl:
+            return None
+        with open(cache_path, 'rb') as f:
+            return json.loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def write_cache(cache_path, result):
+    """Атомарно сохраняет ответ API в кэш"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False)
+    os.replace(tmp_path, cache_path)
+
+
+def prune_cache(ttl):
+    """
+    Удаляет из кэша записи старше ttl секунд (и брошенные .tmp-файлы),
+    чтобы .wordstat_cache/ не рос бесконечно
+
+    Args:
+        ttl: Время жизни кэша в секундах (0 — кэш отключён, ничего не удаляем)
+
+    Returns:
+        int: Количество удалённых файлов
+    """
+    if ttl <= 0:
+        return 0
+
+    deadline = time.time() - ttl
+    removed = 0
+    try:
+        entries = list(os.scandir(CACHE_DIR))
+    except OSError:
+        return 0
+
+    for entry in entries:
+        try:
+            if entry.is_file() and entry.stat().st_mtime < deadline:
+                os.remove(entry.path)
+                removed += 1
+        except OSError:
+            # Файл мог удалить параллельный запуск — не страшно
+            continue
+    return removed
+
+
+def fetch_top_requests_cached(token, phrase, region, devices, cache_ttl, rate_limiter=None, log=print):
+    """
+    Обёртка над fetch_top_requests с дисковым кэшем ответов
+
+    При попадании в кэш запрос к API не выполняется и интервал
+    rate_limiter не расходуется.
+
+    Args:
+        cache_ttl: Время жизни кэша в секундах (0 — кэш отключён)
+        log: Функция вывода сообщений об ошибках и повторах
+
+    Returns:
+        tuple: (результат или None, True если результат взят из кэша)
+    """
+    if cache_ttl <= 0:
+        return fetch_top_requests(token, phrase, region, devices, rate_limiter=rate_limiter, log=log), False
+
+    cache_path = get_cache_path(phrase, region, devices)
+    result = read_cache(cache_path, cache_ttl)
+    if result is not None:
+        return result, True
+
+    result = fetch_top_requests(token, phrase, region, devices, rate_limiter=rate_limiter, log=log)
+    if result:
+        try:
+            write_cache(cache_path, result)
+        except OSError as e:
+            log(f"   ⚠️ Не удалось сохранить кэш: {e}")
+
+    return result, False
+
+
+def prepare_result(result):
+    """Добавляет к каждой фразе ответа её вариант в нижнем регистре (считается один раз)"""
+    if result and 'topRequests' in result:
+        for item in result['topRequests']:
+            item['phrase_lower'] = item['phrase'].lower()
+    return result
+
+
+def fetch_and_prepare(token, phrase, region, devices, cache_ttl, rate_limiter=None):
+    """
+    Задача для пула потоков: получение ответа (из API или кэша) и его подготовка
+
+    prepare_result выполняется в рабочем потоке, пока другие потоки ждут
+    сеть, а не в главном потоке при выводе результатов. Сообщения об ошибках
+    и повторах не печатаются сразу, а собираются, чтобы fetch_all вывел их
+    под строкой прогресса своей фразы.
+
+    Returns:
+        tuple: (подготовленный результат или None, True если из кэша, список сообщений)
+    """
+    messages = []
+    result, from_cache = fetch_top_requests_cached(
+        token, phrase, region, devices, cache_ttl, rate_limiter=rate_limiter, log=messages.append
+    )
+    return prepare_result(result), from_cache, messages
+
+
+def fetch_all(executor, rate_limiter, token, phrases, region, devices, cache_ttl, label=''):
+    """
+    Параллельно получает данные для списка фраз
+
+    Запросы выполняются в общем пуле потоков (`concurrency`), а
+    `delay_between_requests` соблюдается общим rate_limiter как интервал
+    между отправкой запросов, а не как пауза после каждого ответа.
+    Ответы кэшируются на диске на `cache_ttl_seconds` секунд.
+
+    Args:
+        executor: ThreadPoolExecutor, общий для всех уровней парсинга
+        rate_limiter: RateLimiter, общий для всех уровней парсинга
+        token: OAuth токен
+        phrases: Список поисковых фраз
+        region: Код региона
+        devices: Список устройств
+        cache_ttl: Время жизни кэша в секундах
+        label: Пометка уровня для вывода, например " (L2)"
+
+    Returns:
+        list: Результаты в том же порядке, что и фразы
+    """
+    futures = [
+        executor.submit(
+            fetch_and_prepare,
+            token=token,
+            phrase=phrase,
+            region=region,
+            devices=devices,
+            cache_ttl=cache_ttl,
+            rate_limiter=rate_limiter
+        )
+        for phrase in phrases
+    ]
+
+    results = []
+    try:
+        for i, (phrase, future) in enumerate(zip(phrases, futures), 1):
+            result, from_cache, messages = future.result()
+            print(f"[{i}/{len(phrases)}] Парсинг{label}: \"{phrase}\"")
+            for message in messages:
+                print(message)
+
+            if result and 'topRequests' in result:
+                total_count = result.get('totalCount', 0)
+                phrases_count = len(result.get('topRequests', []))
+                cache_note = " [кэш]" if from_cache else ""
+                print(f"   ✅ Получено {phrases_count} фраз ({format_number(total_count)} показов/мес){cache_note}")
+            else:
+                print(f"   ❌ Не удалось получить данные")
+
+            results.append(result)
+    except KeyboardInterrupt:
+        # Ctrl+C: отменяем ещё не начатые задачи и будим потоки, ждущие
+        # очереди rate_limiter, чтобы не отправлять оставшиеся запросы
+        # (cancel_futures у shutdown появился только в Python 3.9)
+        for future in futures:
+            future.cancel()
+        rate_limiter.stop()
+        executor.shutdown(wait=False)
+        raise
+
+    print()
+    return results
+
+
+def prepare_minus_words(minus_words):
+    """
+    Приводит минус-слова к нижнему регистру (один раз в load_config)
+
+    Args:
+        minus_words: Список минус-слов из config.json
+
+    Returns:
+        tuple: Минус-слова в нижнем регистре
+    """
+    return tuple(minus_word.lower() for minus_word in minus_words if minus_word)
+
+
+def has_minus_words(phrase_lower, minus_words):
     """
     Проверяет, содержит ли фраза минус-слова
 
     Args:
-        phrase: Поисковая фраза
-        minus_words: Список минус-слов
+        phrase_lower: Поисковая фраза в нижнем регистре
+        minus_words: Минус-слова в нижнем регистре (settings['minus_words_lower'])
 
     Returns:
         bool: True если фраза содержит минус-слова
@@ -202,63 +633,50 @@ def has_minus_words(phrase, minus_words):
     if not minus_words:
         return False
 
-    phrase_lower = phrase.lower()
+    # Минус-слово может стоять в любой части фразы
     for minus_word in minus_words:
-        if minus_word.lower() in phrase_lower:
+        if minus_word in phrase_lower:
             return True
     return False
 
 
-def categorize_phrase(phrase, city_name):
+# Кэш без ограничения размера: город в пределах запуска один, а сам кэш
+# сбрасывается в начале main(), так что он не растёт между запусками
+@functools.lru_cache(maxsize=None)
+def categorize_phrase(phrase_lower, city_lower):
     """
     Определяет тип поисковой фразы
 
     Args:
-        phrase: Поисковая фраза
-        city_name: Название города для определения локальных запросов
+        phrase_lower: Поисковая фраза в нижнем регистре
+        city_lower: Название города в нижнем регистре для определения локальных запросов
 
     Returns:
         tuple: (категория, эмодзи)
-    """
-    phrase_lower = phrase.lower()
 
-    # Проверка на локальность
-    is_local = city_name.lower() in phrase_lower
-
-    # Приоритет: price > commercial > informational > comparison
-    for category, keywords in CATEGORY_KEYWORDS.items():
+    Пример (проверяется `python3 -m doctest parser.py`):
+        >>> categorize_phrase('как узнать сколько стоит ремонт', 'москва')
+        ('Price', '💰')
+        >>> categorize_phrase('ремонт кухни цена', 'москва')
+        ('Price', '💰')
+        >>> categorize_phrase('как выбрать плитку', 'москва')
+        ('Informational', '📚')
+    """
+    # Приоритет задаётся CATEGORY_PRIORITY: price > commercial > informational > comparison
+    for category, keywords in CATEGORY_MATCHERS:
         for keyword in keywords:
             if keyword in phrase_lower:
                 emoji = CATEGORY_EMOJI.get(category, '🔍')
-                # Добавляем флаг локальности
-                if is_local and category != 'informational':
+                # Флаг локальности не нужен информационным фразам — город не ищем
+                if category != 'informational' and city_lower in phrase_lower:
                     emoji = f"{CATEGORY_EMOJI['local']} {emoji}"
                 return category.capitalize(), emoji
 
     # Если не подошла ни одна категория
-    emoji = CATEGORY_EMOJI['local'] if is_local else CATEGORY_EMOJI['other']
+    emoji = CATEGORY_EMOJI['local'] if city_lower in phrase_lower else CATEGORY_EMOJI['other']
     return 'Other', emoji
 
 
-def track_duplicates(all_phrases):
-    """
-    Отслеживает дубликаты фраз и считает вхождения
-
-    Args:
-        all_phrases: Словарь {фраза: [список запросов, где встречается]}
-
-    Returns:
-        dict: Словарь с дубликатами
-    """
-    duplicates = {}
-
-    for phrase, sources in all_phrases.items():
-        if len(sources) > 1:
-            duplicates[phrase] = len(sources)
-
-    return duplicates
-
-
 def format_number(num):
     """Форматирует число с разделителями тысяч"""
     return f"{num:,}".replace(',', ' ')
@@ -287,8 +705,8 @@ def filter_phrases_by_minus_words(phrases, minus_words):
     Фильтрует фразы по минус-словам
 
     Args:
-        phrases: Список фраз из API
-        minus_words: Список минус-слов
+        phrases: Список фраз из API (после prepare_result)
+        minus_words: Минус-слова в нижнем регистре
 
     Returns:
         tuple: (отфильтрованные фразы, удаленные фразы)
@@ -299,48 +717,113 @@ def filter_phrases_by_minus_words(phrases, minus_words):
     filtered = []
     removed = []
 
+    # phrase_lower уже посчитан в prepare_result — повторно не приводим регистр
     for phrase_data in phrases:
-        phrase = phrase_data['phrase']
-        if has_minus_words(phrase, minus_words):
-            removed.append(phrase)
+        if has_minus_words(phrase_data['phrase_lower'], minus_words):
+            removed.append(phrase_data['phrase'])
         else:
             filtered.append(phrase_data)
 
     return filtered, removed
 
 
-def generate_query_section(query_num, query, result, city, limit, seen_phrases, minus_words=None):
+def select_top_phrases(result, limit, minus_words):
     """
-    Генерирует секцию Markdown для одного запроса
+    Отбирает фразы для секции запроса: фильтрует минус-слова и берёт топ по частотности
 
     Args:
-        query_num: Номер запроса
-        query: Текст запроса
         result: Результат от API
-        city: Название города
-        limit: Лимит фраз для вывода
-        seen_phrases: Словарь отслеживания дубликатов
-        minus_words: Список минус-слов для фильтрации
+        limit: Лимит фраз
+        minus_words: Минус-слова в нижнем регистре
 
     Returns:
-        str: Markdown секция
+        tuple: (топ фраз, удаленные фразы)
     """
-    if not result or 'topRequests' not in result:
-        return f"## 🔍 Запрос {query_num}: {query}\n\n❌ Не удалось получить данные\n\n---\n\n"
-
-    total_count = result.get('totalCount', 0)
     phrases = result.get('topRequests', [])
 
     # Фильтруем по минус-словам
-    filtered_phrases, removed_phrases = filter_phrases_by_minus_words(phrases, minus_words or [])
+    filtered_phrases, removed_phrases = filter_phrases_by_minus_words(phrases, minus_words or ())
+
+    # Топ по частотности: O(N log limit) вместо полной сортировки
+    return heapq.nlargest(limit, filtered_phrases, key=COUNT_KEY), removed_phrases
+
+
+def count_phrase_sources(selections):
+    """
+    Считает для каждой фразы отчёта число запросов, в которых она встречается
+
+    Считается заранее по всем результатам, поэтому пометка о дубликатах
+    одинакова во всех секциях и не зависит от порядка запросов.
+
+    Args:
+        selections: Результаты select_top_phrases по запросам (None — нет данных)
+
+    Returns:
+        Counter: Счётчик {фраза: число запросов, где встречается}
+    """
+    # Сами запросы нигде не выводятся — достаточно счётчика вместо списков
+    source_counts = Counter()
+
+    for selection in selections:
+        if selection:
+            # Повтор фразы внутри одного ответа — всё равно один запрос;
+            # dict.fromkeys, а не set, сохраняет порядок строк в CSV
+            source_counts.update(dict.fromkeys(map(itemgetter('phrase'), selection[0])).keys())
+
+    return source_counts
+
+
+def render_rows(top_phrases, city_lower, source_counts):
+    """
+    Формирует строки таблицы запроса за один проход по фразам
+
+    Категория, пометка о дубликатах и форматирование считаются
+    для каждой фразы сразу, без промежуточных списков.
+
+    Yields:
+        str: Строка Markdown-таблицы
+    """
+    # Локальные ссылки на функции: в цикле по строкам не тратим время
+    # на поиск глобальных имён
+    categorize = categorize_phrase
+    format_count = format_number
+
+    for i, item in enumerate(top_phrases, 1):
+        phrase_text = item['phrase']
+        category, emoji = categorize(item['phrase_lower'], city_lower)
+
+        # Пометка о дубликатах
+        sources_count = source_counts[phrase_text]
+        duplicate_mark = f" *(встречается в {sources_count} запросах)*" if sources_count > 1 else ""
 
-    # Сортируем по частотности
-    phrases_sorted = sorted(filtered_phrases, key=lambda x: x['count'], reverse=True)
-    top_phrases = phrases_sorted[:limit]
+        yield f"| {i} | {phrase_text}{duplicate_mark} | {format_count(item['count'])} | {emoji} {category} |\n"
+
+
+def generate_query_section(out, query_num, query, result, selection, city_lower, limit, source_counts):
+    """
+    Записывает секцию Markdown для одного запроса
+
+    Args:
+        out: Файлоподобный объект для записи
+        query_num: Номер запроса
+        query: Текст запроса
+        result: Результат от API
+        selection: (топ фраз, удаленные фразы) из select_top_phrases или None
+        city_lower: Название города в нижнем регистре
+        limit: Лимит фраз для вывода
+        source_counts: Счётчик {фраза: число запросов} из count_phrase_sources
+    """
+    if not selection:
+        out.write(f"## 🔍 Запрос {query_num}: {query}\n\n❌ Не удалось получить данные\n\n---\n\n")
+        return
+
+    total_count = result.get('totalCount', 0)
+    phrases = result.get('topRequests', [])
+    top_phrases, removed_phrases = selection
 
     removed_note = f"\n**Отфильтровано по минус-словам:** {len(removed_phrases)}" if removed_phrases else ""
 
-    section = f"""## 🔍 Запрос {query_num}: {query}
+    out.write(f"""## 🔍 Запрос {query_num}: {query}
 
 **Общая частотность:** {format_number(total_count)} показов/мес
 **Найдено фраз:** {len(phrases)}{removed_note}
@@ -348,92 +831,92 @@ def generate_query_section(query_num, query, result, city, limit, seen_phrases,
 
 | № | Фраза | Частотность | Тип |
 |---|-------|-------------|-----|
-"""
+""")
 
-    for i, item in enumerate(top_phrases, 1):
-        phrase_text = item['phrase']
-        count = format_number(item['count'])
-        category, emoji = categorize_phrase(phrase_text, city)
-
-        # Отслеживание дубликатов
-        if phrase_text in seen_phrases:
-            seen_phrases[phrase_text].append(query)
-            duplicate_mark = f" *(встречается в {len(seen_phrases[phrase_text])} запросах)*"
-        else:
-            seen_phrases[phrase_text] = [query]
-            duplicate_mark = ""
+    # Строки таблицы уходят в буфер файла по мере формирования
+    out.writelines(render_rows(top_phrases, city_lower, source_counts))
+    out.write("\n---\n\n")
 
-        section += f"| {i} | {phrase_text}{duplicate_mark} | {count} | {emoji} {category} |\n"
 
-    section += "\n---\n\n"
-    return section
-
-
-def generate_summary(all_results, seen_phrases):
+def generate_summary(all_results, source_counts):
     """Генерирует сводную статистику"""
-    # Собираем все фразы
-    all_phrases_list = []
-    for result in all_results:
-        if result and 'topRequests' in result:
-            all_phrases_list.extend(result['topRequests'])
+    all_phrases = itertools.chain.from_iterable(
+        result['topRequests'] for result in all_results if result and 'topRequests' in result
+    )
+
+    # Сворачиваем повторы: фраза из нескольких запросов занимает в топе
+    # одно место с максимальной частотностью
+    phrase_counts = {}
+    for item in all_phrases:
+        phrase = item['phrase']
+        count = item['count']
+        if count > phrase_counts.get(phrase, -1):
+            phrase_counts[phrase] = count
 
-    # Сортируем по частотности
-    all_phrases_sorted = sorted(all_phrases_list, key=lambda x: x['count'], reverse=True)
-    top_10 = all_phrases_sorted[:10]
+    # Топ-10 уникальных фраз по всем запросам
+    top_10 = heapq.nlargest(10, phrase_counts.items(), key=itemgetter(1))
 
-    summary = """## 📈 Сводная статистика
+    parts = ["""## 📈 Сводная статистика
 
 **Топ-10 самых частотных фраз по всем запросам:**
 
 | № | Фраза | Частотность |
 |---|-------|-------------|
-"""
+"""]
 
-    for i, item in enumerate(top_10, 1):
-        phrase = item['phrase']
-        count = format_number(item['count'])
-        summary += f"| {i} | {phrase} | {count} |\n"
+    parts.extend(
+        f"| {i} | {phrase} | {format_number(count)} |\n"
+        for i, (phrase, count) in enumerate(top_10, 1)
+    )
 
     # Статистика дубликатов
-    duplicates = {k: v for k, v in seen_phrases.items() if len(v) > 1}
+    duplicates_count = sum(1 for sources_count in source_counts.values() if sources_count > 1)
+
+    if duplicates_count:
+        parts.append(f"\n**Фразы, встречающиеся в нескольких запросах:** {duplicates_count}\n")
 
-    if duplicates:
-        summary += f"\n**Фразы, встречающиеся в нескольких запросах:** {len(duplicates)}\n"
+    return ''.join(parts)
 
-    return summary
 
+def save_results(config, queries, all_results):
+    """
+    Сохраняет результаты в output/results.md
 
-def save_results(config, queries, all_results, seen_phrases):
-    """Сохраняет результаты в output/results.md"""
-    from datetime import datetime
-    import os
+    Returns:
+        Counter: Счётчик {фраза: число запросов} для статистики и CSV
+    """
 
     timestamp = datetime.now().strftime("%d.%m.%Y %H:%M")
 
     # Создаём папку output, если её нет
     os.makedirs('output', exist_ok=True)
 
-    # Генерируем документ
-    content = generate_header(config, len(queries), timestamp)
-
-    # Добавляем секции для каждого запроса
     limit = config['parser_settings']['top_results_limit']
-    city = config['business_info']['city']
-    minus_words = config['parser_settings'].get('minus_words', [])
+    city_lower = config['business_info']['city_lower']
+    minus_words = config['parser_settings']['minus_words_lower']
+
+    # Фильтр минус-слов и топ по частотности считаются один раз на ответ:
+    # отбор нужен и для счётчика дубликатов, и для секций отчёта
+    selections = [
+        select_top_phrases(result, limit, minus_words) if result and 'topRequests' in result else None
+        for result in all_results
+    ]
+    source_counts = count_phrase_sources(selections)
 
-    for i, (query, result) in enumerate(zip(queries, all_results), 1):
-        section = generate_query_section(i, query, result, city, limit, seen_phrases, minus_words)
-        content += section
+    # Пишем документ на диск посекционно, не собирая его целиком в памяти
+    output_path = 'output/results.md'
+    with open(output_path, 'w', encoding='utf-8', buffering=65536) as f:
+        f.write(generate_header(config, len(queries), timestamp))
 
-    # Добавляем сводную статистику
-    content += generate_summary([r for r in all_results if r], seen_phrases)
+        # Секции для каждого запроса
+        for i, (query, result, selection) in enumerate(zip(queries, all_results, selections), 1):
+            generate_query_section(f, i, query, result, selection, city_lower, limit, source_counts)
 
-    # Сохраняем
-    output_path = 'output/results.md'
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(content)
+        # Сводная статистика
+        f.write(generate_summary([r for r in all_results if r], source_counts))
 
     print(f"\n✅ Результаты сохранены в {output_path}")
+    return source_counts
 
 
 def collect_top_phrases_for_recursion(all_results, minus_words, top_n=10):
@@ -442,69 +925,66 @@ def collect_top_phrases_for_recursion(all_results, minus_words, top_n=10):
 
     Args:
         all_results: Результаты парсинга
-        minus_words: Список минус-слов
+        minus_words: Минус-слова в нижнем регистре
         top_n: Количество топ фраз
 
     Returns:
         list: Список фраз для рекурсивного парсинга
     """
-    all_phrases = []
-
-    for result in all_results:
-        if result and 'topRequests' in result:
-            phrases = result['topRequests']
-            # Фильтруем по минус-словам
-            filtered, _ = filter_phrases_by_minus_words(phrases, minus_words)
-            all_phrases.extend(filtered)
-
-    # Сортируем по частотности и берем топ N
-    sorted_phrases = sorted(all_phrases, key=lambda x: x['count'], reverse=True)
-    top_phrases = sorted_phrases[:top_n]
+    # Фразы без минус-слов отдаются генератором: общий список всех фраз
+    # не строится, nlargest держит в памяти только кучу из top_n элементов
+    candidates = (
+        item
+        for result in all_results if result and 'topRequests' in result
+        for item in result['topRequests']
+        if not has_minus_words(item['phrase_lower'], minus_words)
+    )
+
+    # Топ N по частотности: O(N log top_n) вместо полной сортировки
+    top_phrases = heapq.nlargest(top_n, candidates, key=COUNT_KEY)
 
     return [p['phrase'] for p in top_phrases]
 
 
-def save_to_csv(seen_phrases, minus_words):
+def save_to_csv(source_counts, minus_words):
     """Сохраняет результаты в output/results.csv для удобства работы"""
-    import csv
-    import os
 
     # Создаём папку output, если её нет
     os.makedirs('output', exist_ok=True)
 
-    # Собираем все фразы с их данными
-    phrases_data = []
-    for phrase, sources in seen_phrases.items():
-        if not has_minus_words(phrase, minus_words):
-            # Получаем частотность из первого источника (она одинакова)
-            phrases_data.append({
-                'phrase': phrase,
-                'sources_count': len(sources)
-            })
+    # Строки отдаются writer'у генератором, без промежуточного списка
+    rows = (
+        (phrase, sources_count)
+        for phrase, sources_count in source_counts.items()
+        if not has_minus_words(phrase.lower(), minus_words)
+    )
 
     # Сохраняем CSV
     output_path = 'output/results.csv'
-    with open(output_path, 'w', encoding='utf-8-sig', newline='') as f:
+    with open(output_path, 'w', encoding='utf-8-sig', newline='', buffering=65536) as f:
         writer = csv.writer(f)
         writer.writerow(['Фраза', 'Встречается в запросах'])
-
-        for data in phrases_data:
-            writer.writerow([data['phrase'], data['sources_count']])
+        writer.writerows(rows)
 
     print(f"📊 Экспорт в CSV: {output_path}")
 
 
-def main():
-    """Главная функция парсера"""
-    from datetime import datetime
+def main(config=None):
+    """
+    Главная функция парсера
 
+    Args:
+        config: Уже загруженный config.json (например, из workflow.py);
+            если не передан, читается с диска
+    """
     start_time = datetime.now()
+    categorize_phrase.cache_clear()
 
     print("🚀 Запуск парсера Яндекс Вордстат\n")
 
     # Загрузка конфигурации
     token = load_env()
-    config = load_config()
+    config = load_config() if config is None else prepare_config(config)
     queries = load_queries()
 
     business = config['business_info']
@@ -513,95 +993,73 @@ def main():
     recursive_enabled = settings.get('recursive_parsing', False)
     recursion_depth = settings.get('recursion_depth', 2)
     recursive_top_n = settings.get('recursive_top_queries', 10)
-    minus_words = settings.get('minus_words', [])
+    minus_words = settings['minus_words_lower']
+    concurrency = max(1, settings.get('concurrency', 4))
+    cache_ttl = settings.get('cache_ttl_seconds', 86400)
+    pruned = prune_cache(cache_ttl)
 
     print(f"📂 Регион: {business['city']} ({business['region_code']})")
     print(f"📱 Устройства: {', '.join(settings['devices'])}")
     print(f"📋 Загружено запросов: {len(queries)}")
+    print(f"⚡ Параллельных потоков: {concurrency}")
     if recursive_enabled:
         print(f"🔄 Рекурсивный парсинг: ВКЛ (глубина: {recursion_depth}, топ: {recursive_top_n})")
     if minus_words:
         print(f"🚫 Минус-слова: {len(minus_words)} шт.")
+    if pruned:
+        print(f"🧹 Удалено устаревших записей кэша: {pruned}")
     print()
 
     # Хранилище результатов
     all_results = []
-    seen_phrases = {}
     all_queries = list(queries)  # Копия для рекурсии
 
-    # УРОВЕНЬ 1: Обработка базовых запросов
-    print(f"{'='*50}")
-    print("📍 УРОВЕНЬ 1: Базовые запросы")
-    print(f"{'='*50}\n")
-
-    for i, query in enumerate(queries, 1):
-        print(f"[{i}/{len(queries)}] Парсинг: \"{query}\"")
+    # Пул потоков и ограничитель частоты общие для обоих уровней: L2
+    # переиспользует keep-alive соединения L1 и продолжает тот же интервал
+    rate_limiter = RateLimiter(settings['delay_between_requests'])
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        # УРОВЕНЬ 1: Обработка базовых запросов
+        print(f"{'='*50}")
+        print("📍 УРОВЕНЬ 1: Базовые запросы")
+        print(f"{'='*50}\n")
 
-        result = fetch_top_requests(
+        all_results.extend(fetch_all(
+            executor, rate_limiter,
             token=token,
-            phrase=query,
+            phrases=queries,
             region=business['region_code'],
-            devices=settings['devices']
-        )
-
-        if result and 'topRequests' in result:
-            total_count = result.get('totalCount', 0)
-            phrases_count = len(result.get('topRequests', []))
-            print(f"   ✅ Получено {phrases_count} фраз ({format_number(total_count)} показов/мес)")
-        else:
-            print(f"   ❌ Не удалось получить данные")
-
-        all_results.append(result)
-
-        # Задержка между запросами (кроме последнего)
-        if i < len(queries):
-            delay = settings['delay_between_requests']
-            print(f"   ⏳ Ожидание {delay} сек...\n")
-            time.sleep(delay)
-        else:
-            print()
-
-    # УРОВЕНЬ 2: Рекурсивный парсинг
-    if recursive_enabled and recursion_depth >= 2:
-        print(f"\n{'='*50}")
-        print("📍 УРОВЕНЬ 2: Рекурсивный парсинг топ фраз")
-        print(f"{'='*50}\n")
-
-        # Собираем топ фразы для рекурсии
-        recursive_queries = collect_top_phrases_for_recursion(all_results, minus_words, recursive_top_n)
-        print(f"🎯 Отобрано {len(recursive_queries)} фраз для рекурсивного парсинга\n")
-
-        for i, query in enumerate(recursive_queries, 1):
-            # Пропускаем уже запрошенные фразы
-            if query in all_queries:
-                continue
-
-            all_queries.append(query)
-            print(f"[{i}/{len(recursive_queries)}] Парсинг (L2): \"{query}\"")
-
-            result = fetch_top_requests(
+            devices=settings['devices'],
+            cache_ttl=cache_ttl
+        ))
+
+        # УРОВЕНЬ 2: Рекурсивный парсинг
+        if recursive_enabled and recursion_depth >= 2:
+            print(f"\n{'='*50}")
+            print("📍 УРОВЕНЬ 2: Рекурсивный парсинг топ фраз")
+            print(f"{'='*50}\n")
+
+            # Собираем топ фразы для рекурсии
+            recursive_queries = collect_top_phrases_for_recursion(all_results, minus_words, recursive_top_n)
+            print(f"🎯 Отобрано {len(recursive_queries)} фраз для рекурсивного парсинга\n")
+
+            # Пропускаем уже запрошенные фразы (проверка по множеству, а не по списку)
+            queried = set(all_queries)
+            new_queries = []
+            for query in recursive_queries:
+                if query not in queried:
+                    queried.add(query)
+                    all_queries.append(query)
+                    new_queries.append(query)
+
+            all_results.extend(fetch_all(
+                executor, rate_limiter,
                 token=token,
-                phrase=query,
+                phrases=new_queries,
                 region=business['region_code'],
-                devices=settings['devices']
-            )
-
-            if result and 'topRequests' in result:
-                total_count = result.get('totalCount', 0)
-                phrases_count = len(result.get('topRequests', []))
-                print(f"   ✅ Получено {phrases_count} фраз ({format_number(total_count)} показов/мес)")
-            else:
-                print(f"   ❌ Не удалось получить данные")
-
-            all_results.append(result)
-
-            # Задержка между запросами
-            if i < len(recursive_queries):
-                delay = settings['delay_between_requests']
-                print(f"   ⏳ Ожидание {delay} сек...\n")
-                time.sleep(delay)
-            else:
-                print()
+                devices=settings['devices'],
+                cache_ttl=cache_ttl,
+                label=' (L2)'
+            ))
 
     # Подсчёт успешных запросов
     successful = sum(1 for r in all_results if r)
@@ -614,14 +1072,15 @@ def main():
 
     # Сохранение результатов
     if successful > 0:
-        save_results(config, all_queries, all_results, seen_phrases)
+        # Отчёт заодно возвращает счётчик вхождений фраз по всем запросам
+        source_counts = save_results(config, all_queries, all_results)
 
         # Подсчёт всех уникальных фраз
-        unique_phrases = len(seen_phrases)
+        unique_phrases = len(source_counts)
         print(f"📝 Найдено уникальных фраз: {unique_phrases}")
 
         # Экспорт в CSV
-        save_to_csv(seen_phrases, minus_words)
+        save_to_csv(source_counts, minus_words)
     else:
         print("❌ Нет данных для сохранения")
 
@@ -4,17 +4,67 @@
 AI Content Planner для генерации плана статей на основе результатов парсинга Яндекс Вордстат
 """
 
+import functools
 import json
 import sys
+from dataclasses import dataclass
 from datetime import datetime
-from collections import defaultdict
+from collections import Counter, defaultdict
+from operator import attrgetter
+
+
+# Категории по эмодзи в колонке «Тип» results.md. Порядок важен: в ячейке
+# «📍 🛒 Commercial» должна победить 🛒, поэтому это упорядоченный кортеж,
+# а не regex-поиск (он вернул бы самое левое эмодзи — 📍)
+CATEGORY_BY_EMOJI = (
+    ('🛒', 'commercial'),
+    ('💰', 'price'),
+    ('📚', 'informational'),
+    ('⚖️', 'comparison'),
+    ('📍', 'local'),
+    ('🔍', 'other'),
+)
+
+# Ключ сортировки фраз по частотности (вызывается на уровне C, без lambda)
+FREQUENCY_KEY = attrgetter('frequency')
+
+# Стоп-слова для кластеризации (предлоги, союзы, города)
+ROOT_STOP_WORDS = frozenset({
+    'в', 'на', 'и', 'с', 'под', 'для', 'по', 'от', 'до', 'из', 'к', 'о',
+    'спб', 'санкт', 'петербург', 'москва', 'мск'
+})
+
+# Специальные паттерны для популярных тем: (кластер, подстроки).
+# Побеждает первый совпавший паттерн
+SPECIAL_PATTERNS = (
+    ('под ключ', ('под', 'ключ')),
+    ('цена стоимость', ('цена', 'стоимость', 'сколько', 'стоит', 'прайс')),
+    ('хрущевка', ('хрущевк',)),
+    ('маленькая', ('маленьк', 'небольш')),
+    ('детская', ('детск',)),
+    ('гостиная', ('гостин',)),
+    ('панельный дом', ('панельн',)),
+)
+
+
+@dataclass
+class PhraseRecord:
+    """Фраза из results.md: текст, частотность и категория"""
+    # __slots__ вместо словаря атрибутов: меньше памяти на запись и быстрее
+    # доступ к полям (dataclass(slots=True) требует Python 3.10)
+    __slots__ = ('phrase', 'frequency', 'category')
+
+    phrase: str
+    frequency: int
+    category: str
 
 
 def load_config():
     """Загрузка конфигурации из config.json"""
     try:
-        with open('config.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
+        # json.loads сам определяет UTF-8 по байтам — без текстовой обёртки файла
+        with open('config.json', 'rb') as f:
+            return json.loads(f.read())
     except FileNotFoundError:
         print("❌ Ошибка: файл config.json не найден")
         sys.exit(1)
@@ -26,69 +76,59 @@ def load_config():
 def parse_results_md():
     """Парсинг output/results.md для извлечения данных о ключевых фразах"""
     try:
-        with open('output/results.md', 'r', encoding='utf-8') as f:
-            content = f.read()
+        f = open('output/results.md', 'r', encoding='utf-8')
     except FileNotFoundError:
         print("❌ Ошибка: файл output/results.md не найден. Запустите сначала parser.py")
         sys.exit(1)
 
     phrases = []
-    lines = content.split('\n')
 
-    # Парсим таблицы с фразами
+    # Файл читается построчно, без списка всех строк; строки вне таблиц
+    # отсекаются одной проверкой первого символа
     in_table = False
-    for line in lines:
-        # Определяем начало таблицы
-        if line.startswith('| № | Фраза | Частотность | Тип |'):
-            in_table = True
-            continue
-
-        # Пропускаем разделитель таблицы
-        if in_table and line.startswith('|---|'):
-            continue
-
-        # Парсим строки таблицы
-        if in_table and line.startswith('|'):
-            parts = [p.strip() for p in line.split('|')[1:-1]]
-            if len(parts) >= 4 and parts[0].isdigit():
-                phrase_text = parts[1]
+    with f:
+        for line in f:
+            if not line.startswith('|'):
+                # Конец таблицы
+                if in_table and line.strip() == '---':
+                    in_table = False
+                continue
+
+            # Определяем начало таблицы
+            if not in_table:
+                if line.startswith('| № | Фраза | Частотность | Тип |'):
+                    in_table = True
+                continue
+
+            # Пропускаем разделитель таблицы
+            if line.startswith('|---|'):
+                continue
+
+            # Парсим строки таблицы: | № | Фраза | Частотность | Тип | ...
+            # Делим строку не более чем на 6 частей и чистим только нужные поля
+            fields = line.split('|', 5)
+            if len(fields) == 6 and fields[1].strip().isdigit():
+                phrase_text = fields[2].strip()
                 # Убираем пометку о дубликате
                 if '*(встречается в' in phrase_text:
                     phrase_text = phrase_text.split('*(встречается')[0].strip()
 
                 try:
-                    frequency = int(parts[2].replace(',', '').replace(' ', ''))
+                    frequency = int(fields[3].replace(',', '').replace(' ', ''))
                 except ValueError:
                     continue
 
-                category_raw = parts[3]
+                category_raw = fields[4]
                 category = extract_category(category_raw)
 
-                phrases.append({
-                    'phrase': phrase_text,
-                    'frequency': frequency,
-                    'category': category
-                })
-
-        # Конец таблицы
-        if in_table and line.strip() == '---':
-            in_table = False
+                phrases.append(PhraseRecord(phrase_text, frequency, category))
 
     return phrases
 
 
 def extract_category(category_str):
     """Извлечение категории из строки с эмодзи"""
-    category_map = {
-        '🛒': 'commercial',
-        '💰': 'price',
-        '📚': 'informational',
-        '⚖️': 'comparison',
-        '📍': 'local',
-        '🔍': 'other'
-    }
-
-    for emoji, cat in category_map.items():
+    for emoji, cat in CATEGORY_BY_EMOJI:
         if emoji in category_str:
             return cat
     return 'other'
@@ -155,88 +195,79 @@ def deduplicate_phrases(phrases):
 
     for p in phrases:
         # Группируем по нормализованному ключу
-        key = normalize_phrase(p['phrase'])
+        key = normalize_phrase(p.phrase)
         grouped[key].append(p)
 
     # Для каждой группы берём вариант с максимальной частотностью
     deduplicated = []
     for variants in grouped.values():
-        best = max(variants, key=lambda x: x['frequency'])
+        best = max(variants, key=FREQUENCY_KEY)
         deduplicated.append(best)
 
     return deduplicated
 
 
+@functools.lru_cache(maxsize=None)
 def extract_root_words(phrase):
     """
     Извлекает корневые слова из фразы для кластеризации
 
+    Результат кэшируется: одна и та же фраза разбирается один раз.
+
     Args:
         phrase: Фраза для анализа
 
     Returns:
-        set: Набор значимых слов
+        frozenset: Набор значимых слов
     """
-    # Стоп-слова (предлоги, союзы и т.д.)
-    stop_words = {
-        'в', 'на', 'и', 'с', 'под', 'для', 'по', 'от', 'до', 'из', 'к', 'о',
-        'спб', 'санкт', 'петербург', 'москва', 'мск'
-    }
-
     words = phrase.lower().split()
     # Убираем стоп-слова и короткие слова
-    meaningful = {w for w in words if len(w) > 2 and w not in stop_words}
+    return frozenset(w for w in words if len(w) > 2 and w not in ROOT_STOP_WORDS)
 
-    return meaningful
 
-
-def find_semantic_cluster(phrase, phrase_data, existing_clusters, min_common_words=2):
+def find_semantic_cluster(phrase, word_index, cluster_names, min_common_words=2):
     """
     Находит семантический кластер для фразы на основе общих слов
 
     Args:
         phrase: Фраза для кластеризации
-        phrase_data: Данные фразы (частотность, категория)
-        existing_clusters: Существующие кластеры
+        word_index: Инвертированный индекс {слово: [номера кластеров]}
+            по корневым словам первых фраз кластеров
+        cluster_names: Названия кластеров в порядке создания
         min_common_words: Минимальное количество общих слов
 
     Returns:
         str: Название кластера или None
     """
-    phrase_words = extract_root_words(phrase)
+    # Проверяем специальные паттерны (регистр приводится один раз)
+    phrase_lower = phrase.lower()
+    for cluster_name, pattern_words in SPECIAL_PATTERNS:
+        for word in pattern_words:
+            if word in phrase_lower:
+                return cluster_name
 
-    # Специальные паттерны для популярных тем
-    special_patterns = {
-        'под ключ': {'под', 'ключ'},
-        'цена стоимость': {'цена', 'стоимость', 'сколько', 'стоит', 'прайс'},
-        'хрущевка': {'хрущевк'},
-        'маленькая': {'маленьк', 'небольш'},
-        'детская': {'детск'},
-        'гостиная': {'гостин'},
-        'панельный дом': {'панельн'}
-    }
+    phrase_words = extract_root_words(phrase)
 
-    # Проверяем специальные паттерны
-    for cluster_name, pattern_words in special_patterns.items():
-        if any(word in phrase.lower() for word in pattern_words):
-            return cluster_name
+    # Общих слов не может быть больше, чем слов во фразе: короткие фразы
+    # не дотянут до порога ни с одним кластером
+    if len(phrase_words) < min_common_words:
+        return None
 
-    # Ищем кластер с максимальным совпадением слов
-    best_match = None
-    max_common = 0
+    # Считаем общие слова только с кластерами, у которых есть хотя бы
+    # одно совпадение, вместо перебора всех кластеров
+    common_counts = Counter()
+    for word in phrase_words:
+        common_counts.update(word_index.get(word, ()))
 
-    for cluster_name, cluster_phrases in existing_clusters.items():
-        # Берем первую фразу кластера как эталон
-        if cluster_phrases:
-            reference_phrase = cluster_phrases[0]['phrase']
-            reference_words = extract_root_words(reference_phrase)
-            common_words = phrase_words & reference_words
+    if not common_counts:
+        return None
 
-            if len(common_words) >= min_common_words and len(common_words) > max_common:
-                max_common = len(common_words)
-                best_match = cluster_name
+    # Максимум совпадений; при равенстве побеждает более ранний кластер
+    cluster_id, max_common = min(common_counts.items(), key=lambda item: (-item[1], item[0]))
+    if max_common < min_common_words:
+        return None
 
-    return best_match
+    return cluster_names[cluster_id]
 
 
 def cluster_phrases(phrases, config):
@@ -262,10 +293,10 @@ def cluster_phrases(phrases, config):
     # Фильтруем фразы по минимальной частотности и релевантности
     filtered = []
     for p in phrases:
-        if p['frequency'] < min_freq:
+        if p.frequency < min_freq:
             continue
 
-        phrase_lower = p['phrase'].lower()
+        phrase_lower = p.phrase.lower()
 
         # Проверяем, есть ли нерелевантные слова
         has_irrelevant = any(word in phrase_lower for word in irrelevant_keywords)
@@ -278,16 +309,18 @@ def cluster_phrases(phrases, config):
     filtered = deduplicate_phrases(filtered)
 
     # Сортируем по частотности (самые частотные будут создавать кластеры)
-    filtered.sort(key=lambda x: x['frequency'], reverse=True)
+    filtered.sort(key=FREQUENCY_KEY, reverse=True)
 
-    # Семантические кластеры
+    # Семантические кластеры и индекс по корневым словам их первых фраз
     semantic_clusters = defaultdict(list)
+    word_index = defaultdict(list)
+    cluster_names = []
 
     for phrase_data in filtered:
-        phrase = phrase_data['phrase']
+        phrase = phrase_data.phrase
 
         # Пытаемся найти существующий кластер
-        cluster_name = find_semantic_cluster(phrase, phrase_data, semantic_clusters)
+        cluster_name = find_semantic_cluster(phrase, word_index, cluster_names)
 
         if cluster_name:
             # Добавляем в существующий кластер
@@ -304,10 +337,15 @@ def cluster_phrases(phrases, config):
 
             semantic_clusters[cluster_name].append(phrase_data)
 
-    # Сортируем каждую группу по частотности
-    for cluster in semantic_clusters:
-        semantic_clusters[cluster].sort(key=lambda x: x['frequency'], reverse=True)
+        # Первая фраза кластера становится его эталоном
+        if len(semantic_clusters[cluster_name]) == 1:
+            cluster_id = len(cluster_names)
+            cluster_names.append(cluster_name)
+            for word in extract_root_words(phrase):
+                word_index[word].append(cluster_id)
 
+    # Фразы добавлялись в порядке убывания частотности, поэтому каждый
+    # кластер уже отсортирован — повторная сортировка не нужна
     return semantic_clusters
 
 
@@ -325,6 +363,90 @@ def calculate_priority(frequency):
         return "★☆☆☆☆", "Низкий"
 
 
+# Готовые формы предложного падежа для городов и частых слов
+PREPOSITIONAL_FORMS = {
+    # Города
+    'москва': 'Москве',
+    'санкт-петербург': 'Санкт-Петербурге',
+    'петербург': 'Петербурге',
+    'казань': 'Казани',
+    'екатеринбург': 'Екатеринбурге',
+    'новосибирск': 'Новосибирске',
+    'нижний новгород': 'Нижнем Новгороде',
+    'самара': 'Самаре',
+    'омск': 'Омске',
+    'челябинск': 'Челябинске',
+    'ростов-на-дону': 'Ростове-на-Дону',
+    'уфа': 'Уфе',
+    'красноярск': 'Красноярске',
+    'воронеж': 'Воронеже',
+    'пермь': 'Перми',
+    'волгоград': 'Волгограде',
+    'краснодар': 'Краснодаре',
+    'саратов': 'Саратове',
+    'тюмень': 'Тюмени',
+    'тольятти': 'Тольятти',
+    'ижевск': 'Ижевске',
+    'барнаул': 'Барнауле',
+    'ульяновск': 'Ульяновске',
+    'иркутск': 'Иркутске',
+    'хабаровск': 'Хабаровске',
+    'ярославль': 'Ярославле',
+    'владивосток': 'Владивостоке',
+    'махачкала': 'Махачкале',
+    'томск': 'Томске',
+    'оренбург': 'Оренбурге',
+    'кемерово': 'Кемерово',
+    'новокузнецк': 'Новокузнецке',
+    'рязань': 'Рязани',
+    'астрахань': 'Астрахани',
+    'набережные челны': 'Набережных Челнах',
+    'пенза': 'Пензе',
+    'киров': 'Кирове',
+    'липецк': 'Липецке',
+    'чебоксары': 'Чебоксарах',
+    'калининград': 'Калининграде',
+    'тула': 'Туле',
+    'сочи': 'Сочи',
+    'ставрополь': 'Ставрополе',
+    'курск': 'Курске',
+    'улан-удэ': 'Улан-Удэ',
+    'тверь': 'Твери',
+    'магнитогорск': 'Магнитогорске',
+    'иваново': 'Иваново',
+    'брянск': 'Брянске',
+    'белгород': 'Белгороде',
+    'сургут': 'Сургуте',
+    'владимир': 'Владимире',
+    'нижний тагил': 'Нижнем Тагиле',
+    'архангельск': 'Архангельске',
+    'чита': 'Чите',
+    'калуга': 'Калуге',
+    'смоленск': 'Смоленске',
+    'волжский': 'Волжском',
+    'якутск': 'Якутске',
+    'саранск': 'Саранске',
+    'череповец': 'Череповце',
+    'вологда': 'Вологде',
+    'владикавказ': 'Владикавказе',
+    'грозный': 'Грозном',
+    'мурманск': 'Мурманске',
+    'тамбов': 'Тамбове',
+    'петрозаводск': 'Петрозаводске',
+    'кострома': 'Костроме',
+    'орел': 'Орле',
+    'новороссийск': 'Новороссийске',
+    'йошкар-ола': 'Йошкар-Оле',
+
+    # Страны
+    'россия': 'России',
+    'украина': 'Украине',
+    'беларусь': 'Беларуси',
+    'казахстан': 'Казахстане',
+}
+
+
+@functools.lru_cache(maxsize=1024)
 def decline_word_prepositional(word):
     """
     Склонение слова в предложный падеж (отвечает на вопрос "о чём? где?")
@@ -337,91 +459,9 @@ def decline_word_prepositional(word):
     """
     word_lower = word.lower()
 
-    # Словарь готовых форм для городов и частых слов
-    prepositional_dict = {
-        # Города
-        'москва': 'Москве',
-        'санкт-петербург': 'Санкт-Петербурге',
-        'петербург': 'Петербурге',
-        'казань': 'Казани',
-        'екатеринбург': 'Екатеринбурге',
-        'новосибирск': 'Новосибирске',
-        'нижний новгород': 'Нижнем Новгороде',
-        'самара': 'Самаре',
-        'омск': 'Омске',
-        'челябинск': 'Челябинске',
-        'ростов-на-дону': 'Ростове-на-Дону',
-        'уфа': 'Уфе',
-        'красноярск': 'Красноярске',
-        'воронеж': 'Воронеже',
-        'пермь': 'Перми',
-        'волгоград': 'Волгограде',
-        'краснодар': 'Краснодаре',
-        'саратов': 'Саратове',
-        'тюмень': 'Тюмени',
-        'тольятти': 'Тольятти',
-        'ижевск': 'Ижевске',
-        'барнаул': 'Барнауле',
-        'ульяновск': 'Ульяновске',
-        'иркутск': 'Иркутске',
-        'хабаровск': 'Хабаровске',
-        'ярославль': 'Ярославле',
-        'владивосток': 'Владивостоке',
-        'махачкала': 'Махачкале',
-        'томск': 'Томске',
-        'оренбург': 'Оренбурге',
-        'кемерово': 'Кемерово',
-        'новокузнецк': 'Новокузнецке',
-        'рязань': 'Рязани',
-        'астрахань': 'Астрахани',
-        'набережные челны': 'Набережных Челнах',
-        'пенза': 'Пензе',
-        'киров': 'Кирове',
-        'липецк': 'Липецке',
-        'чебоксары': 'Чебоксарах',
-        'калининград': 'Калининграде',
-        'тула': 'Туле',
-        'сочи': 'Сочи',
-        'ставрополь': 'Ставрополе',
-        'курск': 'Курске',
-        'улан-удэ': 'Улан-Удэ',
-        'тверь': 'Твери',
-        'магнитогорск': 'Магнитогорске',
-        'иваново': 'Иваново',
-        'брянск': 'Брянске',
-        'белгород': 'Белгороде',
-        'сургут': 'Сургуте',
-        'владимир': 'Владимире',
-        'нижний тагил': 'Нижнем Тагиле',
-        'архангельск': 'Архангельске',
-        'чита': 'Чите',
-        'калуга': 'Калуге',
-        'смоленск': 'Смоленске',
-        'волжский': 'Волжском',
-        'якутск': 'Якутске',
-        'саранск': 'Саранске',
-        'череповец': 'Череповце',
-        'вологда': 'Вологде',
-        'владикавказ': 'Владикавказе',
-        'грозный': 'Грозном',
-        'мурманск': 'Мурманске',
-        'тамбов': 'Тамбове',
-        'петрозаводск': 'Петрозаводске',
-        'кострома': 'Костроме',
-        'орел': 'Орле',
-        'новороссийск': 'Новороссийске',
-        'йошкар-ола': 'Йошкар-Оле',
-
-        # Страны
-        'россия': 'России',
-        'украина': 'Украине',
-        'беларусь': 'Беларуси',
-        'казахстан': 'Казахстане',
-    }
-
     # Проверяем словарь
-    if word_lower in prepositional_dict:
-        return prepositional_dict[word_lower]
+    if word_lower in PREPOSITIONAL_FORMS:
+        return PREPOSITIONAL_FORMS[word_lower]
 
     # Правила склонения для незнакомых слов
     # Город на -бург → -бурге
@@ -476,58 +516,107 @@ def capitalize_phrase(phrase):
     return phrase[0].upper() + phrase[1:]
 
 
-def generate_article_title(phrase, category, config):
-    """Генерация заголовка статьи на основе ключевой фразы и категории"""
-    city = config['business_info']['city']
-    phrase_lower = phrase.lower()
+@functools.lru_cache(maxsize=8)
+def get_city_forms(city):
+    """
+    Варианты названия города для заголовков (считаются один раз на город)
+
+    Args:
+        city: Название города из config.json
 
+    Returns:
+        tuple: (предложный падеж, полное название в нижнем регистре,
+                аббревиатура в нижнем регистре)
+    """
     # Определяем варианты названия города
     if '-' in city:
         # Для составных городов: полное название и аббревиатура
-        city_full = city
         city_abbr = ''.join([word[0].upper() for word in city.split('-')]) + 'б'  # СПб, НН и т.д.
     else:
         # Для обычных городов: только полное название
-        city_full = city
         city_abbr = city
 
     # Склоняем город в предложный падеж (где? в чём?)
-    city_prepositional = decline_word_prepositional(city_full)
-
-    # Проверяем, есть ли уже город в фразе
-    has_city_full = city_full.lower() in phrase_lower
-    has_city_abbr = city_abbr.lower() in phrase_lower
-    has_spb = 'спб' in phrase_lower  # для Санкт-Петербурга
-
-    # Шаблоны заголовков для разных типов (строительство и ремонт)
-    templates = {
-        'commercial': [
-            f"{capitalize_phrase(phrase)} в {city_prepositional}" if not (has_city_full or has_city_abbr or has_spb) else f"{capitalize_phrase(phrase)}",
-            f"{capitalize_phrase(phrase)}: цены и сроки" if not (has_city_full or has_city_abbr or has_spb) else f"{capitalize_phrase(phrase)} — актуальные расценки",
-            f"{capitalize_phrase(phrase)}: недорого с гарантией"
-        ],
-        'price': [
-            f"Сколько стоит {phrase}" if not phrase_lower.startswith('сколько') and not phrase_lower.startswith('цена') else f"{capitalize_phrase(phrase)}",
-            f"{capitalize_phrase(phrase)} в {city_prepositional}: цены 2025" if not (has_city_full or has_city_abbr or has_spb) else f"{capitalize_phrase(phrase)} — обзор цен",
-            f"{capitalize_phrase(phrase)}: расценки бригад"
-        ],
-        'informational': [
-            f"{capitalize_phrase(phrase)}: полное руководство",
-            f"Как сделать {phrase}" if not phrase_lower.startswith('как') else f"{capitalize_phrase(phrase)}: пошаговая инструкция",
-            f"{capitalize_phrase(phrase)}: этапы и особенности"
-        ],
-        'comparison': [
-            f"{capitalize_phrase(phrase)}: что лучше выбрать",
-            f"{capitalize_phrase(phrase)}: сравнение вариантов и отзывы"
-        ],
-        'other': [
-            f"{capitalize_phrase(phrase)} в {city_prepositional}" if not (has_city_full or has_city_abbr or has_spb) else f"{capitalize_phrase(phrase)}",
-            f"{capitalize_phrase(phrase)}: советы и рекомендации"
-        ]
-    }
+    city_prepositional = decline_word_prepositional(city)
+
+    return city_prepositional, city.lower(), city_abbr.lower()
+
+
+# Шаблоны заголовков для разных типов (строительство и ремонт).
+# Каждая функция строит варианты только для своей категории; первый
+# вариант — самый релевантный.
+# Функции вызываются через TITLE_BUILDERS, поэтому сигнатура у всех одна:
+# (phrase, phrase_lower, cap, city_prepositional, has_city) — фраза, фраза
+# в нижнем регистре, фраза с заглавной буквы, город в предложном падеже,
+# есть ли город во фразе. Каждая использует только нужные ей аргументы.
+
+def build_commercial_titles(phrase, phrase_lower, cap, city_prepositional, has_city):
+    """Заголовки для коммерческих запросов"""
+    return [
+        f"{cap} в {city_prepositional}" if not has_city else cap,
+        f"{cap}: цены и сроки" if not has_city else f"{cap} — актуальные расценки",
+        f"{cap}: недорого с гарантией"
+    ]
 
-    # Получаем список шаблонов для категории и используем первый (самый релевантный)
-    category_templates = templates.get(category, templates['other'])
+
+def build_price_titles(phrase, phrase_lower, cap, city_prepositional, has_city):
+    """Заголовки для ценовых запросов"""
+    return [
+        f"Сколько стоит {phrase}" if not phrase_lower.startswith(('сколько', 'цена')) else cap,
+        f"{cap} в {city_prepositional}: цены 2025" if not has_city else f"{cap} — обзор цен",
+        f"{cap}: расценки бригад"
+    ]
+
+
+def build_informational_titles(phrase, phrase_lower, cap, city_prepositional, has_city):
+    """Заголовки для информационных запросов"""
+    return [
+        f"{cap}: полное руководство",
+        f"Как сделать {phrase}" if not phrase_lower.startswith('как') else f"{cap}: пошаговая инструкция",
+        f"{cap}: этапы и особенности"
+    ]
+
+
+def build_comparison_titles(phrase, phrase_lower, cap, city_prepositional, has_city):
+    """Заголовки для запросов-сравнений"""
+    return [
+        f"{cap}: что лучше выбрать",
+        f"{cap}: сравнение вариантов и отзывы"
+    ]
+
+
+def build_other_titles(phrase, phrase_lower, cap, city_prepositional, has_city):
+    """Заголовки для прочих запросов"""
+    return [
+        f"{cap} в {city_prepositional}" if not has_city else cap,
+        f"{cap}: советы и рекомендации"
+    ]
+
+
+TITLE_BUILDERS = {
+    'commercial': build_commercial_titles,
+    'price': build_price_titles,
+    'informational': build_informational_titles,
+    'comparison': build_comparison_titles,
+    'other': build_other_titles,
+}
+
+
+def generate_article_title(phrase, category, config):
+    """Генерация заголовка статьи на основе ключевой фразы и категории"""
+    city_prepositional, city_full_lower, city_abbr_lower = get_city_forms(config['business_info']['city'])
+    phrase_lower = phrase.lower()
+
+    # Проверяем, есть ли уже город в фразе ('спб' — для Санкт-Петербурга)
+    has_city = (
+        city_full_lower in phrase_lower
+        or city_abbr_lower in phrase_lower
+        or 'спб' in phrase_lower
+    )
+
+    # Строим шаблоны только для нужной категории и используем первый (самый релевантный)
+    build_titles = TITLE_BUILDERS.get(category, build_other_titles)
+    category_templates = build_titles(phrase, phrase_lower, capitalize_phrase(phrase), city_prepositional, has_city)
     return category_templates[0]
 
 
@@ -557,7 +646,7 @@ def generate_content_plan(clusters, config):
     # Сортируем кластеры по общей частотности (самые частотные темы — первыми)
     sorted_clusters = sorted(
         clusters.items(),
-        key=lambda x: sum(p['frequency'] for p in x[1]),
+        key=lambda x: sum(p.frequency for p in x[1]),
         reverse=True
     )
 
@@ -566,7 +655,7 @@ def generate_content_plan(clusters, config):
             continue
 
         # Определяем приоритет кластера по максимальной частотности
-        max_freq = max(p['frequency'] for p in block_phrases)
+        max_freq = max(p.frequency for p in block_phrases)
         if max_freq >= 500:
             priority = "максимальный"
         elif max_freq >= 200:
@@ -582,13 +671,13 @@ def generate_content_plan(clusters, config):
         }
 
         for phrase_data in block_phrases:
-            stars, priority_text = calculate_priority(phrase_data['frequency'])
+            stars, priority_text = calculate_priority(phrase_data.frequency)
 
             article = {
                 'number': article_counter,
-                'title': generate_article_title(phrase_data['phrase'], phrase_data['category'], config),
-                'key_phrase': phrase_data['phrase'],
-                'frequency': phrase_data['frequency'],
+                'title': generate_article_title(phrase_data.phrase, phrase_data.category, config),
+                'key_phrase': phrase_data.phrase,
+                'frequency': phrase_data.frequency,
                 'priority': priority_text,
                 'stars': stars
             }
@@ -602,13 +691,13 @@ def generate_content_plan(clusters, config):
     return plan
 
 
-def format_markdown_plan(plan, config):
-    """Форматирование плана статей в Markdown"""
+def format_markdown_plan(plan, config, out):
+    """Форматирование плана статей в Markdown с записью в out по мере генерации"""
     meta = plan['meta']
     business = config['business_info']
     settings = config['content_plan_settings']
 
-    md = f"""# ПЛАН СТАТЕЙ: {business['niche'].upper()} {business['city'].upper()}
+    out.write(f"""# ПЛАН СТАТЕЙ: {business['niche'].upper()} {business['city'].upper()}
 
 ## 📊 Общая информация
 
@@ -620,7 +709,7 @@ def format_markdown_plan(plan, config):
 
 ---
 
-"""
+""")
 
     # Генерируем блоки статей
     for idx, block in enumerate(plan['blocks'], 1):
@@ -629,41 +718,41 @@ def format_markdown_plan(plan, config):
         # Форматируем название кластера (капитализация)
         cluster_title = block['category'].upper()
 
-        md += f"""## 🎯 БЛОК {idx}: {cluster_title} ({block['articles_count']} статей)
+        out.write(f"""## 🎯 БЛОК {idx}: {cluster_title} ({block['articles_count']} статей)
 *Приоритет: {block['priority'].upper()} | Целевой трафик: {total_traffic:,}+ запросов/мес*
 
 | № | Тема статьи | Ключевой запрос | Частотность | Приоритет |
 |---|-------------|-----------------|-------------|-----------|
-"""
+""")
 
-        for article in block['articles']:
-            md += f"| {article['number']} | **{article['title']}** | {article['key_phrase']} ({article['frequency']}) | {article['priority']} | {article['stars']} |\n"
+        out.writelines(
+            f"| {article['number']} | **{article['title']}** | {article['key_phrase']} ({article['frequency']}) | {article['priority']} | {article['stars']} |\n"
+            for article in block['articles']
+        )
 
-        md += "\n---\n\n"
+        out.write("\n---\n\n")
 
     # Добавляем календарный план
-    md += generate_calendar_plan(plan, settings)
+    generate_calendar_plan(plan, settings, out)
 
     # Добавляем целевые показатели
-    md += generate_target_metrics(meta, settings)
+    generate_target_metrics(meta, settings, out)
 
     # Добавляем рекомендации по контенту
-    md += generate_content_recommendations(business, settings)
+    generate_content_recommendations(business, settings, out)
 
     # Добавляем стратегию перелинковки
-    md += generate_crosslinking_strategy(settings)
+    generate_crosslinking_strategy(settings, out)
 
-    return md
 
-
-def generate_calendar_plan(plan, settings):
+def generate_calendar_plan(plan, settings, out):
     """Генерация календарного плана публикаций"""
     articles_per_month = settings['articles_per_month']
     total = plan['meta']['total_articles']
 
-    md = """## 📅 КАЛЕНДАРНЫЙ ПЛАН ПУБЛИКАЦИЙ
+    out.write("""## 📅 КАЛЕНДАРНЫЙ ПЛАН ПУБЛИКАЦИЙ
 
-"""
+""")
 
     month = 1
     article_start = 1
@@ -672,20 +761,21 @@ def generate_calendar_plan(plan, settings):
         articles_in_block = len(block['articles'])
         months_needed = (articles_in_block + articles_per_month - 1) // articles_per_month
 
-        md += f"### **МЕСЯЦ {month}-{month + months_needed - 1}: {block['category'].capitalize()} блок ({articles_in_block} статей)**\n"
-        md += f"**Приоритет:** {block['priority']}\n"
-        md += f"- Статьи {article_start}-{article_start + articles_in_block - 1}\n\n"
+        out.write(
+            f"### **МЕСЯЦ {month}-{month + months_needed - 1}: {block['category'].capitalize()} блок ({articles_in_block} статей)**\n"
+            f"**Приоритет:** {block['priority']}\n"
+            f"- Статьи {article_start}-{article_start + articles_in_block - 1}\n\n"
+        )
 
         month += months_needed
         article_start += articles_in_block
 
-    md += "\n---\n\n"
-    return md
+    out.write("\n---\n\n")
 
 
-def generate_target_metrics(meta, settings):
+def generate_target_metrics(meta, settings, out):
     """Генерация целевых показателей"""
-    md = """## 🎯 ЦЕЛЕВЫЕ ПОКАЗАТЕЛИ
+    out.write(f"""## 🎯 ЦЕЛЕВЫЕ ПОКАЗАТЕЛИ
 
 ### **После 3 месяцев:**
 - **Органический трафик:** 30-40% от целевого
@@ -693,21 +783,20 @@ def generate_target_metrics(meta, settings):
 - **Конверсия в заявки:** 1.5-2%
 
 ### **После 6 месяцев:**
-- **Органический трафик:** """ + meta['expected_traffic'] + """ посетителей/месяц
-- **Позиции в ТОП-10:** """ + str(settings['target_top_positions']) + """+ ключевых запросов
-- **Конверсия в заявки:** """ + meta['conversion_rate'] + """%
+- **Органический трафик:** {meta['expected_traffic']} посетителей/месяц
+- **Позиции в ТОП-10:** {settings['target_top_positions']}+ ключевых запросов
+- **Конверсия в заявки:** {meta['conversion_rate']}%
 
 ---
 
-"""
-    return md
+""")
 
 
-def generate_content_recommendations(business, settings):
+def generate_content_recommendations(business, settings, out):
     """Генерация рекомендаций по контенту"""
     utp_list = '\n'.join([f"✅ **{utp}**" for utp in business['utp']])
 
-    md = f"""## 💡 РЕКОМЕНДАЦИИ ПО КОНТЕНТУ
+    out.write(f"""## 💡 РЕКОМЕНДАЦИИ ПО КОНТЕНТУ
 
 ### **Обязательные элементы каждой статьи:**
 ✅ **8-12 внутренних ссылок** на смежные страницы
@@ -730,16 +819,15 @@ def generate_content_recommendations(business, settings):
 
 ---
 
-"""
-    return md
+""")
 
 
-def generate_crosslinking_strategy(settings):
+def generate_crosslinking_strategy(settings, out):
     """Генерация стратегии перелинковки"""
     links = '\n'.join([f"{i+1}. `{link}`" for i, link in enumerate(settings['internal_links'])])
     anchors = '\n'.join([f'- "{anchor}"' for anchor in settings['anchor_texts']])
 
-    md = f"""## 🔗 СТРАТЕГИЯ ПЕРЕЛИНКОВКИ
+    out.write(f"""## 🔗 СТРАТЕГИЯ ПЕРЕЛИНКОВКИ
 
 ### **Приоритетные ссылки в каждой статье:**
 {links}
@@ -752,35 +840,49 @@ def generate_crosslinking_strategy(settings):
 **ИТОГО: Полный план статей для продвижения в ТОП-10**
 
 *Планируемый результат: органический трафик и лидогенерация*
-"""
-    return md
+""")
 
 
-def save_content_plan(markdown_content):
-    """Сохранение плана статей в output/content_plan.md"""
+def save_content_plan(plan, config):
+    """Форматирование и сохранение плана статей в output/content_plan.md"""
     import os
 
     # Создаём папку output, если её нет
     os.makedirs('output', exist_ok=True)
 
     output_file = 'output/content_plan.md'
+    tmp_file = f"{output_file}.tmp"
     try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(markdown_content)
-        print(f"✅ План статей сохранён в {output_file}")
-        return output_file
-    except Exception as e:
+        # Markdown пишется посекционно во временный файл; прежний план
+        # заменяется только после успешной генерации всего документа
+        with open(tmp_file, 'w', encoding='utf-8', buffering=65536) as f:
+            format_markdown_plan(plan, config, f)
+        os.replace(tmp_file, output_file)
+    except OSError as e:
         print(f"❌ Ошибка при сохранении: {e}")
         sys.exit(1)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+    print(f"✅ План статей сохранён в {output_file}")
+    return output_file
 
 
-def main():
-    """Главная функция"""
+def main(config=None):
+    """
+    Главная функция
+
+    Args:
+        config: Уже загруженный config.json (например, из workflow.py);
+            если не передан, читается с диска
+    """
     print("🚀 Запуск AI Content Planner\n")
 
     # Загрузка конфигурации
     print("📂 Загрузка конфигурации...")
-    config = load_config()
+    if config is None:
+        config = load_config()
 
     # Парсинг results.md
     print("📊 Анализ results.md...")
@@ -797,13 +899,9 @@ def main():
     plan = generate_content_plan(clusters, config)
     print(f"   ✅ Запланировано {plan['meta']['total_articles']} статей")
 
-    # Форматирование в Markdown
-    print("📝 Форматирование в Markdown...")
-    markdown = format_markdown_plan(plan, config)
-
-    # Сохранение
-    print("💾 Сохранение плана...")
-    save_content_plan(markdown)
+    # Форматирование в Markdown и сохранение
+    print("📝 Форматирование в Markdown и сохранение плана...")
+    save_content_plan(plan, config)
 
     print("\n🎉 Готово! План статей сформирован")
 
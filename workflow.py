@@ -6,41 +6,84 @@ AI Workflow Orchestrator - Полная автоматизация от конф
 Запуск: python3 workflow.py
 """
 
+import argparse
+import functools
+import hashlib
+import importlib.util
 import json
+import os
 import subprocess
 import sys
 import time
 from datetime import datetime
 
+from config_schema import validate_config
+
+
+# Разделители заголовков и шагов
+HEADER_LINE = "=" * 60
+STEP_LINE = "-" * 60
+
+# Результаты парсера и отпечаток входных данных, по которым они получены
+RESULTS_PATH = 'output/results.md'
+PARSER_STAMP_PATH = 'output/.parser_stamp'
+# Отметка, которую parser.py пишет в секцию запроса, не получившего данных
+FAILED_QUERY_MARKER = "❌ Не удалось получить данные"
+
+# Поля config.json, которые использует сам workflow, и их допустимые типы;
+# проверяются общим validate_config из config_schema.py, а поля парсера
+# проверяет сам parser.py при запуске
+CONFIG_SCHEMA = {
+    'business_info': {
+        'niche': (str,),
+        'city': (str,),
+        'services': (list,),
+    },
+    'parser_settings': {},
+    'content_plan_settings': {
+        'target_page': (str,),
+        'articles_per_month': (int,),
+        'planning_period_months': (int,),
+        'expected_traffic_per_month': (str, int),
+    },
+}
+
 
 def print_header(text):
     """Красивый заголовок"""
-    print("\n" + "=" * 60)
-    print(f"  {text}")
-    print("=" * 60 + "\n")
+    print(f"\n{HEADER_LINE}\n  {text}\n{HEADER_LINE}\n")
 
 
 def print_step(step_num, total_steps, description):
     """Вывод текущего шага"""
-    print(f"📍 ШАГ {step_num}/{total_steps}: {description}")
-    print("-" * 60)
+    print(f"📍 ШАГ {step_num}/{total_steps}: {description}\n{STEP_LINE}")
 
 
-def load_config():
-    """Загрузка и валидация конфигурации"""
-    try:
-        with open('config.json', 'r', encoding='utf-8') as f:
-            config = json.load(f)
+@functools.lru_cache(maxsize=None)
+def load_module(name):
+    """
+    Загружает модуль <name>.py из текущей папки (один раз за запуск)
+
+    Args:
+        name: Имя модуля ('parser' или 'planner')
 
-        # Проверка обязательных полей
-        required_fields = ['business_info', 'parser_settings', 'content_plan_settings']
-        for field in required_fields:
-            if field not in config:
-                print(f"❌ Ошибка: отсутствует секция '{field}' в config.json")
-                sys.exit(1)
+    Returns:
+        module: Загруженный модуль
+    """
+    # Модуль загружается по пути к файлу: имя parser в Python 3.8/3.9
+    # совпадает со стандартным модулем
+    spec = importlib.util.spec_from_file_location(name, f'{name}.py')
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
 
-        return config
 
+def load_config():
+    """Загрузка и валидация конфигурации"""
+    try:
+        with open('config.json', 'rb') as f:
+            config = json.loads(f.read())
     except FileNotFoundError:
         print("❌ Ошибка: файл config.json не найден")
         print("💡 Создайте config.json на основе примера из документации")
@@ -49,6 +92,35 @@ def load_config():
         print(f"❌ Ошибка в config.json: {e}")
         sys.exit(1)
 
+    # Проверка обязательных полей и их типов тем же валидатором, что в parser.py
+    error = validate_config(config, CONFIG_SCHEMA)
+    if error:
+        print(f"❌ Ошибка: {error}")
+        sys.exit(1)
+
+    return config
+
+
+def query_from_competitor_url(url):
+    """
+    Извлекает запрос из последнего сегмента пути URL конкурента
+
+    Args:
+        url: URL страницы конкурента
+
+    Returns:
+        str: Запрос из URL или None, если сегмент слишком короткий
+    """
+    # Пример: /remont-komnat/ → "ремонт комнат"
+    path = url.split('/')[-2] if url.endswith('/') else url.split('/')[-1]
+    # Убираем расширения
+    path = path.replace('.html', '').replace('.php', '')
+
+    # Преобразуем дефисы в пробелы
+    query_from_url = path.replace('-', ' ')
+
+    return query_from_url if len(query_from_url) > 3 else None
+
 
 def extract_queries_from_competitors(competitors):
     """
@@ -60,33 +132,23 @@ def extract_queries_from_competitors(competitors):
     Returns:
         list: Список дополнительных запросов
     """
-    import urllib.request
-    import re
-
-    additional_queries = []
+    # dict сохраняет порядок добавления и проверяет вхождение за O(1)
+    additional_queries = {}
 
     print("   🔍 Анализ URL конкурентов...")
 
     for url in competitors:
         try:
-            # Извлекаем ключи из самого URL
-            # Пример: /remont-komnat/ → "ремонт комнат"
-            path = url.split('/')[-2] if url.endswith('/') else url.split('/')[-1]
-            # Убираем расширения
-            path = path.replace('.html', '').replace('.php', '')
-
-            # Преобразуем дефисы в пробелы
-            query_from_url = path.replace('-', ' ')
-
-            if len(query_from_url) > 3 and query_from_url not in additional_queries:
-                additional_queries.append(query_from_url)
-                print(f"      • {query_from_url} (из URL)")
-
+            query_from_url = query_from_competitor_url(url)
         except Exception as e:
             print(f"      ⚠️  Не удалось обработать {url}: {e}")
             continue
 
-    return additional_queries
+        if query_from_url and query_from_url not in additional_queries:
+            additional_queries[query_from_url] = None
+            print(f"      • {query_from_url} (из URL)")
+
+    return list(additional_queries)
 
 
 def generate_queries(config):
@@ -103,7 +165,8 @@ def generate_queries(config):
     queries = []
 
     # 1. Прямые запросы по нише
-    city_short = 'спб' if 'санкт-петербург' in city.lower() else city.lower()
+    city_lower = city.lower()
+    city_short = 'спб' if 'санкт-петербург' in city_lower else city_lower
     queries.append(f"{niche} {city_short}")
     queries.append(f"{niche} цена {city_short}")
 
@@ -129,128 +192,243 @@ def generate_queries(config):
     # 6. Запросы от конкурентов
     if competitors:
         print()
-        competitor_queries = extract_queries_from_competitors(competitors)
-        # Добавляем только уникальные запросы
-        for q in competitor_queries:
-            if q not in queries:
-                queries.append(q)
+        queries.extend(extract_queries_from_competitors(competitors))
+
+    # Убираем повторы одним проходом, сохраняя порядок запросов
+    queries = list(dict.fromkeys(queries))
 
     # Сохраняем queries.txt
     try:
-        with open('queries.txt', 'w', encoding='utf-8') as f:
-            f.write('\n'.join(queries))
-        print(f"\n   ✅ Сгенерировано {len(queries)} запросов")
-        print(f"   📄 Сохранено в queries.txt")
+        # Файл пишется целиком одним write уже закодированных байтов
+        data = '\n'.join(queries).encode('utf-8')
+        with open('queries.txt', 'wb') as f:
+            f.write(data)
+        print(f"\n   ✅ Сгенерировано {len(queries)} запросов\n   📄 Сохранено в queries.txt")
         return len(queries)
     except Exception as e:
         print(f"   ❌ Ошибка при сохранении queries.txt: {e}")
         sys.exit(1)
 
 
-def run_parser():
-    """Запуск парсера Яндекс Вордстат"""
-    print("🚀 Запуск парсера Яндекс Вордстат...")
-    print("   ⏳ Это может занять несколько минут...\n")
+def run_module_main(name, config):
+    """
+    Выполняет main() модуля <name>.py в текущем процессе
+
+    Args:
+        name: Имя модуля ('parser' или 'planner')
+        config: Уже загруженная конфигурация, передаётся в main()
+
+    Returns:
+        int: Код завершения (0 — успех)
+    """
+    module = load_module(name)
 
     try:
-        # Запускаем parser.py
-        result = subprocess.run(
-            ['python3', 'parser.py'],
-            capture_output=True,
-            text=True,
-            encoding='utf-8'
-        )
-
-        # Выводим результат
-        if result.stdout:
-            print(result.stdout)
-
-        if result.returncode != 0:
-            print(f"❌ Парсер завершился с ошибкой:")
-            if result.stderr:
-                print(result.stderr)
-            sys.exit(1)
+        module.main(config)
+    except SystemExit as e:
+        # Модули сообщают об ошибках через sys.exit(1)
+        if e.code not in (None, 0):
+            return e.code if isinstance(e.code, int) else 1
+    return 0
 
-        print("   ✅ Парсинг завершён успешно")
-        return True
 
-    except FileNotFoundError:
-        print("❌ Ошибка: файл parser.py не найден")
-        sys.exit(1)
-    except Exception as e:
-        print(f"❌ Ошибка при запуске парсера: {e}")
-        sys.exit(1)
+def run_script(script):
+    """
+    Запускает скрипт отдельным процессом с трансляцией вывода
 
+    Args:
+        script: Имя файла скрипта
 
-def run_planner():
-    """Запуск планировщика контента"""
-    print("🎯 Запуск AI Content Planner...")
-    print("   📊 Анализ результатов и генерация плана статей...\n")
+    Returns:
+        int: Код завершения процесса
+    """
+    # -u: без буферизации, вывод виден сразу
+    process = subprocess.Popen(
+        ['python3', '-u', script],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        encoding='utf-8',
+        bufsize=1
+    )
 
+    # Транслируем вывод построчно, не накапливая его в памяти
+    with process.stdout:
+        for line in process.stdout:
+            sys.stdout.write(line)
+
+    return process.wait()
+
+
+def parser_inputs_fingerprint(config):
+    """
+    Отпечаток входных данных парсера: queries.txt и его настройки
+
+    Args:
+        config: Загруженная конфигурация (до запуска парсера)
+
+    Returns:
+        str: Хэш содержимого queries.txt, business_info и parser_settings
+    """
+    with open('queries.txt', 'rb') as f:
+        queries_bytes = f.read()
+    settings_bytes = json.dumps(
+        [config['business_info'], config['parser_settings']],
+        ensure_ascii=False, sort_keys=True
+    ).encode('utf-8')
+    return hashlib.blake2b(queries_bytes + b'\0' + settings_bytes, digest_size=16).hexdigest()
+
+
+def parser_results_up_to_date(fingerprint, ttl):
+    """
+    Проверяет, получен ли текущий output/results.md по тем же входным данным
+
+    Args:
+        fingerprint: Отпечаток текущих входных данных парсера
+        ttl: Сколько секунд результаты считаются свежими (как кэш ответов API)
+
+    Returns:
+        bool: True, если парсер можно не запускать
+    """
     try:
-        # Запускаем planner.py
-        result = subprocess.run(
-            ['python3', 'planner.py'],
-            capture_output=True,
-            text=True,
-            encoding='utf-8'
-        )
-
-        # Выводим результат
-        if result.stdout:
-            print(result.stdout)
-
-        if result.returncode != 0:
-            print(f"❌ Планировщик завершился с ошибкой:")
-            if result.stderr:
-                print(result.stderr)
+        with open(PARSER_STAMP_PATH, 'r', encoding='utf-8') as f:
+            stamp = f.read().strip()
+        results_stat = os.stat(RESULTS_PATH)
+    except OSError:
+        return False
+
+    # Отпечаток привязан к mtime results.md: если файл перезаписан в обход
+    # workflow (например, отдельным запуском parser.py), отметка недействительна
+    if stamp != f"{fingerprint} {results_stat.st_mtime_ns}":
+        return False
+    return time.time() - results_stat.st_mtime <= ttl
+
+
+def save_parser_stamp(fingerprint):
+    """Сохраняет отпечаток входных данных вместе с mtime текущего results.md"""
+    with open(PARSER_STAMP_PATH, 'w', encoding='utf-8') as f:
+        f.write(f"{fingerprint} {os.stat(RESULTS_PATH).st_mtime_ns}")
+
+
+def results_have_failures():
+    """Проверяет, есть ли в output/results.md запросы без данных"""
+    with open(RESULTS_PATH, 'rb') as f:
+        return FAILED_QUERY_MARKER.encode('utf-8') in f.read()
+
+
+def get_mtime_ns(path):
+    """Время изменения файла в наносекундах или None, если файла нет"""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def run_module(name, config, use_subprocess, title, success_message):
+    """
+    Запуск parser.py или planner.py с общей обработкой ошибок
+
+    Args:
+        name: Имя модуля ('parser' или 'planner')
+        config: Уже загруженная конфигурация
+        use_subprocess: Запускать отдельным процессом вместо импорта
+        title: Название шага для сообщения об ошибке
+        success_message: Сообщение об успешном завершении
+
+    Returns:
+        bool: True при успешном завершении (при ошибке — выход из программы)
+    """
+    script = f'{name}.py'
+
+    # Наличие скрипта проверяется заранее: FileNotFoundError из main() модуля
+    # (например, нет queries.txt) — ошибка шага, а не отсутствие скрипта
+    if not os.path.exists(script):
+        print(f"❌ Ошибка: файл {script} не найден")
+        sys.exit(1)
+
+    try:
+        # По умолчанию модуль выполняется в этом же процессе с уже
+        # загруженной конфигурацией, без запуска второго интерпретатора
+        if use_subprocess:
+            returncode = run_script(script)
+        else:
+            returncode = run_module_main(name, config)
+
+        if returncode != 0:
+            print(f"❌ {title} завершился с ошибкой (код {returncode})")
             sys.exit(1)
 
-        print("   ✅ План статей сформирован")
+        print(f"   ✅ {success_message}")
         return True
 
-    except FileNotFoundError:
-        print("❌ Ошибка: файл planner.py не найден")
-        sys.exit(1)
     except Exception as e:
-        print(f"❌ Ошибка при запуске планировщика: {e}")
+        print(f"❌ Ошибка при выполнении {script}: {e}")
         sys.exit(1)
 
 
+def run_parser(config, use_subprocess=False):
+    """Запуск парсера Яндекс Вордстат"""
+    print("🚀 Запуск парсера Яндекс Вордстат...")
+    print("   ⏳ Это может занять несколько минут...\n")
+
+    return run_module('parser', config, use_subprocess, "Парсер", "Парсинг завершён успешно")
+
+
+def run_planner(config, use_subprocess=False):
+    """Запуск планировщика контента"""
+    print("🎯 Запуск AI Content Planner...")
+    print("   📊 Анализ результатов и генерация плана статей...\n")
+
+    return run_module('planner', config, use_subprocess, "Планировщик", "План статей сформирован")
+
+
 def display_summary(config, start_time):
     """Вывод итоговой информации"""
-    elapsed = time.time() - start_time
+    elapsed = time.perf_counter() - start_time
 
     print_header("🎉 WORKFLOW ЗАВЕРШЁН")
 
-    print("📂 Созданные файлы:")
-    print("   • queries.txt              - поисковые запросы")
-    print("   • output/results.md        - результаты парсинга Вордстат")
-    print("   • output/results.csv       - экспорт в CSV")
-    print("   • output/content_plan.md   - готовый план статей\n")
-
     business = config['business_info']
     settings = config['content_plan_settings']
 
-    print("📊 Итоговая информация:")
-    print(f"   • Ниша: {business['niche']}")
-    print(f"   • Город: {business['city']}")
-    print(f"   • Целевая страница: {settings['target_page']}")
-    print(f"   • Запланировано статей: {settings['articles_per_month'] * settings['planning_period_months']}")
-    print(f"   • Период создания: {settings['planning_period_months']} месяцев")
-    print(f"   • Ожидаемый трафик: {settings['expected_traffic_per_month']} в месяц\n")
+    # Итог выводится одним вызовом print вместо двух десятков
+    print(f"""📂 Созданные файлы:
+   • queries.txt              - поисковые запросы
+   • output/results.md        - результаты парсинга Вордстат
+   • output/results.csv       - экспорт в CSV
+   • output/content_plan.md   - готовый план статей
+
+📊 Итоговая информация:
+   • Ниша: {business['niche']}
+   • Город: {business['city']}
+   • Целевая страница: {settings['target_page']}
+   • Запланировано статей: {settings['articles_per_month'] * settings['planning_period_months']}
+   • Период создания: {settings['planning_period_months']} месяцев
+   • Ожидаемый трафик: {settings['expected_traffic_per_month']} в месяц
 
-    print(f"⏱️  Время выполнения: {elapsed:.1f} сек\n")
+⏱️  Время выполнения: {elapsed:.1f} сек
 
-    print("💡 Следующие шаги:")
-    print("   1. Откройте output/content_plan.md для просмотра плана статей")
-    print("   2. Скорректируйте приоритеты и темы при необходимости")
-    print("   3. Начните создание контента по календарному плану\n")
+💡 Следующие шаги:
+   1. Откройте output/content_plan.md для просмотра плана статей
+   2. Скорректируйте приоритеты и темы при необходимости
+   3. Начните создание контента по календарному плану
+""")
 
 
 def main():
     """Главная функция workflow"""
-    start_time = time.time()
+    arg_parser = argparse.ArgumentParser(description="AI Workflow: от config.json до контент-плана")
+    arg_parser.add_argument(
+        '--subprocess', action='store_true',
+        help="запускать parser.py и planner.py отдельными процессами"
+    )
+    arg_parser.add_argument(
+        '--force', action='store_true',
+        help="запускать парсер, даже если queries.txt и настройки не изменились"
+    )
+    args = arg_parser.parse_args()
+
+    start_time = time.perf_counter()
 
     print_header("🤖 AI WORKFLOW: АВТОМАТИЗАЦИЯ SEO-ПЛАНИРОВАНИЯ")
 
@@ -268,12 +446,29 @@ def main():
 
     # ШАГ 3: Парсинг Яндекс Вордстат
     print_step(3, 4, "Парсинг Яндекс Вордстат API")
-    run_parser()
+    # Отпечаток считается до запуска: парсер дополняет config производными полями
+    fingerprint = parser_inputs_fingerprint(config)
+    results_ttl = config['parser_settings'].get('cache_ttl_seconds', 86400)
+
+    if not args.force and parser_results_up_to_date(fingerprint, results_ttl):
+        print("♻️  queries.txt и настройки парсера не изменились — используется готовый output/results.md")
+        print("   💡 Для повторного парсинга запустите: python3 workflow.py --force")
+    else:
+        results_mtime = get_mtime_ns(RESULTS_PATH)
+        run_parser(config, args.subprocess)
+
+        # Отпечаток сохраняется, только если парсер обновил результаты и все
+        # запросы получены: неудачные не кэшируются и должны повториться
+        if get_mtime_ns(RESULTS_PATH) not in (None, results_mtime):
+            if results_have_failures():
+                print("⚠️  Часть запросов не получена — при следующем запуске парсер будет выполнен снова")
+            else:
+                save_parser_stamp(fingerprint)
     print()
 
     # ШАГ 4: Генерация контент-плана
     print_step(4, 4, "Генерация плана статей")
-    run_planner()
+    run_planner(config, args.subprocess)
     print()
 
     # Итоговая информация